@@ -0,0 +1,420 @@
+"""Benchmark the Sony Bravia client against local mock TVs.
+
+Runs a fixed set of scenarios against `braviapsk.mock_server.MockBraviaServer`
+instances and prints one line per scenario, so the effect of a change can be
+compared in numbers:
+
+    python benchmarks/bench_client.py --latency 0.005 --channels 2000
+"""
+import argparse
+import asyncio
+import collections
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from braviapsk.async_bravia_psk import AsyncBraviaRC  # noqa: E402
+from braviapsk.channels import ChannelDirectory  # noqa: E402
+from braviapsk.discovery import MAX_PROBES, PROBE_TIMEOUT, BraviaDiscovery  # noqa: E402
+from braviapsk.fleet import BraviaFleet  # noqa: E402
+from braviapsk.metrics import BraviaStats  # noqa: E402
+from braviapsk.mock_server import MockBraviaServer  # noqa: E402
+from braviapsk.readcache import READ_CACHE_TTL  # noqa: E402
+from braviapsk.recorder import TrafficRecorder, replay_transport  # noqa: E402
+from braviapsk.sony_bravia_psk import BraviaRC  # noqa: E402
+from braviapsk.transport import TRANSPORTS  # noqa: E402
+
+SCENARIOS = []
+# run in a fresh process: seconds to import the client, seconds until the
+# first response and maximum RSS in kB (ru_maxrss includes the parent on Linux)
+STARTUP_SCRIPT = """
+import resource, sys, time
+start = time.perf_counter()
+from braviapsk.sony_bravia_psk import BraviaRC
+imported = time.perf_counter() - start
+BraviaRC(sys.argv[1], sys.argv[2], transport=sys.argv[3]).get_power_status()
+answered = time.perf_counter() - start
+try:
+    with open("/proc/self/status") as status:
+        rss = [line.split()[1] for line in status if line.startswith("VmHWM:")][0]
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(imported, answered, rss)
+"""
+
+
+def scenario(function):
+    """Register a benchmark scenario."""
+    SCENARIOS.append(function)
+    return function
+
+
+def timed(function, *args):
+    """Return the seconds it takes to call function(*args)."""
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def report(name, samples, unit="ms", extra=""):
+    """Print the statistics of a list of durations in seconds."""
+    samples = sorted(samples)
+    scale = 1000 if unit == "ms" else 1
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(
+        "%-36s n=%-5d mean=%9.3f%s p50=%9.3f%s p95=%9.3f%s %s"
+        % (
+            name,
+            len(samples),
+            statistics.mean(samples) * scale,
+            unit,
+            statistics.median(samples) * scale,
+            unit,
+            p95 * scale,
+            unit,
+            extra,
+        )
+    )
+
+
+@scenario
+def per_call_latency(args):
+    """Measure a single get_power_status call on a warm connection."""
+    with MockBraviaServer(latency=args.latency) as server:
+        for name in sorted(TRANSPORTS):
+            connections = server.connections
+            with BraviaRC(
+                server.host,
+                server.psk,
+                read_ttl={"getPowerStatus": 0},
+                transport=name,
+            ) as braviarc:
+                samples = [
+                    timed(braviarc.get_power_status) for _ in range(args.iterations)
+                ]
+                report(
+                    "get_power_status transport=%s" % name,
+                    samples,
+                    extra="connections=%d" % (server.connections - connections),
+                )
+
+
+@scenario
+def startup(args):
+    """Measure import time, first response and memory of a fresh process."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    with MockBraviaServer(latency=args.latency) as server:
+        for name in sorted(TRANSPORTS):
+            imported = []
+            answered = []
+            rss = []
+            for _ in range(max(1, args.iterations // 20)):
+                output = subprocess.run(
+                    [
+                        sys.executable,
+                        "-c",
+                        STARTUP_SCRIPT,
+                        server.host,
+                        server.psk,
+                        name,
+                    ],
+                    env=env,
+                    check=True,
+                    stdout=subprocess.PIPE,
+                ).stdout.split()
+                imported.append(float(output[0]))
+                answered.append(float(output[1]))
+                rss.append(int(output[2]))
+            report("startup transport=%s import" % name, imported)
+            report(
+                "startup transport=%s first_response" % name,
+                answered,
+                extra="rss=%dkB" % statistics.median(rss),
+            )
+
+
+@scenario
+def observer_overhead(args):
+    """Measure get_power_status with and without a BraviaStats observer."""
+    with MockBraviaServer(latency=args.latency) as server:
+        for observer in (None, BraviaStats()):
+            # Send every call, a reused read result is not observed.
+            with BraviaRC(
+                server.host,
+                server.psk,
+                observer=observer,
+                read_ttl={"getPowerStatus": 0},
+            ) as braviarc:
+                braviarc.get_power_status()
+                samples = [
+                    timed(braviarc.get_power_status) for _ in range(args.iterations)
+                ]
+                report("get_power_status observer=%s" % bool(observer), samples)
+
+
+@scenario
+def state_snapshot(args):
+    """Measure a full get_state snapshot."""
+    with MockBraviaServer(latency=args.latency) as server:
+        with BraviaRC(server.host, server.psk) as braviarc:
+            samples = [timed(braviarc.get_state) for _ in range(args.iterations)]
+            report("get_state", samples)
+
+
+@scenario
+def inventory(args):
+    """Request the full inventory one call at a time and as one batch."""
+    with MockBraviaServer(latency=args.latency) as server:
+        # Without reusing read results, both sides send every request.
+        read_ttl = dict.fromkeys(READ_CACHE_TTL, 0)
+        with BraviaRC(server.host, server.psk, read_ttl=read_ttl) as braviarc:
+            getters = (
+                braviarc.get_system_info,
+                braviarc.get_network_info,
+                braviarc.get_power_status,
+                braviarc.get_volume_info,
+                braviarc.get_playing_info,
+                braviarc.get_current_external_input_status,
+                braviarc.load_app_list,
+            )
+
+            def one_by_one():
+                for getter in getters:
+                    getter()
+
+            samples = [timed(one_by_one) for _ in range(args.iterations)]
+            report("inventory one_by_one", samples)
+            samples = [timed(braviarc.get_inventory) for _ in range(args.iterations)]
+            report("inventory batch", samples)
+
+
+@scenario
+def open_app(args):
+    """Open an app by title after fetching the app list and from the catalog."""
+    with MockBraviaServer(latency=args.latency) as server:
+        with BraviaRC(server.host, server.psk) as braviarc:
+
+            def list_and_open():
+                for app in braviarc.load_app_list():
+                    if app["title"] == "YouTube":
+                        braviarc.open_app(app["uri"])
+
+            samples = [timed(list_and_open) for _ in range(args.iterations)]
+            report("open_app list_and_open", samples)
+            braviarc.get_app_catalog()
+            samples = [
+                timed(braviarc.open_app_by_name, "youtube")
+                for _ in range(args.iterations)
+            ]
+            report("open_app by_name", samples)
+
+
+@scenario
+def discovery(args):
+    """Scan a /24 with a mock TV, a /24 nobody answers and search with SSDP."""
+    with MockBraviaServer(latency=args.latency, ssdp_port=0) as server:
+        port = int(server.host.rsplit(":", 1)[1])
+        discoverer = BraviaDiscovery(server.psk, port=port)
+        samples = [timed(discoverer.scan, ["127.0.0.0/24"]) for _ in range(3)]
+        report("scan 127.0.0.0/24", samples)
+        # TEST-NET-1 is never routed, every probe waits for its timeout.
+        samples = [timed(discoverer.scan, ["192.0.2.0/24"])]
+        report(
+            "scan 192.0.2.0/24 unanswered",
+            samples,
+            extra="max_probes=%d probe_timeout=%.1fs" % (MAX_PROBES, PROBE_TIMEOUT),
+        )
+        discoverer = BraviaDiscovery(
+            server.psk, ssdp_address=server.ssdp_address, ssdp_timeout=0.2
+        )
+        samples = [timed(discoverer.discover) for _ in range(3)]
+        report("discover ssdp", samples, extra="ssdp_timeout=0.2s")
+
+
+@scenario
+def replay(args):
+    """Record a session against a mock TV and replay it at several speeds."""
+    read_ttl = {"getPowerStatus": 0, "getVolumeInformation": 0}
+
+    def session(braviarc):
+        for _ in range(args.iterations):
+            braviarc.get_power_status()
+            braviarc.get_volume_info()
+        braviarc.get_inventory()
+
+    with tempfile.TemporaryDirectory() as directory:
+        log = os.path.join(directory, "traffic.log")
+        with MockBraviaServer(latency=args.latency) as server:
+            with TrafficRecorder(log) as recorder, BraviaRC(
+                server.host, server.psk, read_ttl=read_ttl, recorder=recorder
+            ) as braviarc:
+                report("live recorded", [timed(session, braviarc)])
+            with BraviaRC(server.host, server.psk, read_ttl=read_ttl) as braviarc:
+                report("live", [timed(session, braviarc)])
+            host = server.host
+        for speed in (1, 10, 0):
+            with BraviaRC(
+                host,
+                server.psk,
+                read_ttl=read_ttl,
+                transport=replay_transport(log, speed),
+            ) as braviarc:
+                report("replay speed=%s" % speed, [timed(session, braviarc)])
+        print("log: %d bytes" % os.path.getsize(log))
+
+
+@scenario
+def command_throughput(args):
+    """Measure key presses per second with send_command."""
+    with MockBraviaServer(latency=args.latency) as server:
+        with BraviaRC(server.host, server.psk) as braviarc:
+            braviarc.prepare_commands()
+            samples = [
+                timed(braviarc.send_command, "VolumeUp") for _ in range(args.iterations)
+            ]
+            report(
+                "send_command",
+                samples,
+                extra="%.0f/s" % (len(samples) / sum(samples)),
+            )
+
+
+@scenario
+def volume_macro(args):
+    """Send fifteen volume up presses through the command pipeline."""
+    with MockBraviaServer(latency=args.latency) as server:
+        with BraviaRC(server.host, server.psk) as braviarc:
+            braviarc.prepare_commands()
+            samples = []
+            for _ in range(max(1, args.iterations // 15)):
+                pipeline = braviarc.pipeline().volume_up(15)
+                samples.append(pipeline.flush().latency)
+            report("pipeline volume_up x15", samples)
+
+
+@scenario
+def source_list(args):
+    """Load the content list sequentially and concurrently."""
+    channels = {"tv:dvbc": args.channels, "tv:dvbt": args.channels // 4}
+    with MockBraviaServer(latency=args.latency, channels=channels) as server:
+        for concurrent in (False, True):
+            with BraviaRC(server.host, server.psk) as braviarc:
+                samples = [
+                    timed(braviarc.load_source_list, concurrent) for _ in range(3)
+                ]
+                report(
+                    "load_source_list concurrent=%s" % concurrent,
+                    samples,
+                    extra="channels=%d" % sum(channels.values()),
+                )
+
+
+@scenario
+def channel_directory(args):
+    """Index a 10k channel lineup and look channels up."""
+    channels = {"tv:dvbs": 8000, "tv:dvbt": 2000}
+    with MockBraviaServer(channels=channels) as server:
+        with BraviaRC(server.host, server.psk) as braviarc:
+            content_list = list(braviarc.iter_source_list(concurrent=True))
+    samples = [timed(ChannelDirectory, content_list) for _ in range(5)]
+    directory = ChannelDirectory(content_list)
+    mapping = collections.OrderedDict(
+        (content["title"], content["uri"]) for content in content_list
+    )
+    report(
+        "ChannelDirectory build",
+        samples,
+        extra="channels=%d memory=%.1fMB (OrderedDict %.1fMB)"
+        % (
+            len(directory),
+            directory.memory_usage() / 1e6,
+            (
+                sys.getsizeof(mapping)
+                + sum(map(sys.getsizeof, mapping))
+                + sum(map(sys.getsizeof, mapping.values()))
+            )
+            / 1e6,
+        ),
+    )
+    queries = ["DVBT Channel %d" % number for number in range(1, 2000, 7)]
+    report("ChannelDirectory.find", [timed(directory.find, query) for query in queries])
+    report(
+        "ChannelDirectory.search",
+        [timed(directory.search, query[:10]) for query in queries[:20]],
+    )
+
+
+@scenario
+def fleet_sweep(args):
+    """Poll many TVs, one of them slow."""
+    servers = [MockBraviaServer(latency=args.latency).start() for _ in range(args.tvs)]
+    servers[0].latency = args.latency * 10
+    try:
+        tvs = [{"host": server.host, "psk": server.psk} for server in servers]
+        with BraviaFleet(tvs) as fleet:
+            samples = [timed(fleet.poll) for _ in range(max(1, args.iterations // 20))]
+            report("fleet poll", samples, extra="tvs=%d" % args.tvs)
+    finally:
+        for server in servers:
+            server.stop()
+
+
+@scenario
+def async_fan_out(args):
+    """Fan out 100 concurrent getPowerStatus requests on AsyncBraviaRC."""
+    # Identical concurrent reads share one request, distinct bodies do not.
+    bodies = [
+        '{"method":"getPowerStatus","params":[],"id":%d,"version":"1.0"}' % number
+        for number in range(1, 101)
+    ]
+
+    async def run(server):
+        async with AsyncBraviaRC(
+            server.host, server.psk, read_ttl={"getPowerStatus": 0}
+        ) as braviarc:
+            samples = []
+            for _ in range(max(1, args.iterations // 20)):
+                start = time.perf_counter()
+                await asyncio.gather(
+                    *[braviarc.bravia_req_json("sony/system", body) for body in bodies]
+                )
+                samples.append(time.perf_counter() - start)
+            return samples
+
+    with MockBraviaServer(latency=args.latency) as server:
+        samples = asyncio.run(run(server))
+        report(
+            "async 100x getPowerStatus",
+            samples,
+            extra="requests/round=%d"
+            % (server.requests["getPowerStatus"] / len(samples)),
+        )
+
+
+def main():
+    """Run the selected scenarios."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.002)
+    parser.add_argument("--channels", type=int, default=1000)
+    parser.add_argument("--tvs", type=int, default=20)
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        help="names of the scenarios to run, all by default: %s"
+        % ", ".join(function.__name__ for function in SCENARIOS),
+    )
+    args = parser.parse_args()
+    for function in SCENARIOS:
+        if not args.scenarios or function.__name__ in args.scenarios:
+            function(args)
+
+
+if __name__ == "__main__":
+    main()
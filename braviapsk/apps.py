@@ -0,0 +1,143 @@
+"""Application catalog of a Sony Bravia TV.
+
+`AppCatalog` keeps the getApplicationList result as slotted `App` records
+indexed by URI and by title ignoring case, so an app can be opened by name
+without asking the TV for the whole list first. `IconCache` keeps fetched app
+icons in a bounded LRU.
+"""
+import collections
+import logging
+import threading
+import time
+
+APP_CATALOG_TTL = 3600  # seconds before the app list is refreshed in the background
+ICON_CACHE_SIZE = 64  # number of app icons kept in memory
+ICON_TIMEOUT = 5  # seconds to wait for an icon
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class App(object):
+    """An application installed on the TV."""
+
+    __slots__ = ("title", "uri", "icon")
+
+    def __init__(self, title, uri, icon=None):
+        """Initialize the app."""
+        self.title = title
+        self.uri = uri
+        self.icon = icon
+
+    def __repr__(self):
+        """Return a readable representation."""
+        return "App(%r, %r)" % (self.title, self.uri)
+
+    @classmethod
+    def from_item(cls, item):
+        """Create an app from a getApplicationList item."""
+        return cls(item.get("title", ""), item["uri"], item.get("icon") or None)
+
+
+class AppCatalog(object):
+    """Apps of one TV, in TV order, by URI and by title ignoring case."""
+
+    def __init__(self, app_list=()):
+        """Index an app list as returned by getApplicationList."""
+        self._apps = [App.from_item(item) for item in app_list if "uri" in item]
+        self._by_uri = {app.uri: app for app in self._apps}
+        self._by_title = {}
+        for app in self._apps:
+            self._by_title.setdefault(app.title.casefold(), []).append(app)
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        """Return the number of apps."""
+        return len(self._apps)
+
+    def __iter__(self):
+        """Iterate over the apps in TV order."""
+        return iter(self._apps)
+
+    @property
+    def age(self):
+        """Return the seconds since the app list was received."""
+        return time.monotonic() - self.loaded_at
+
+    def by_uri(self, uri):
+        """Return the app with the given URI, None if unknown."""
+        return self._by_uri.get(uri)
+
+    def by_title(self, title):
+        """Return the apps with the given title, ignoring case."""
+        return list(self._by_title.get(title.casefold(), ()))
+
+    def find(self, query):
+        """Return the app best matching query, None if there is none.
+
+        Tries in turn the exact title, the title ignoring case, the URI and a
+        title prefix matching a single app, e.g. "you" for YouTube.
+        """
+        apps = self.by_title(query)
+        exact = [app for app in apps if app.title == query]
+        if exact or apps:
+            return (exact or apps)[0]
+        app = self.by_uri(query)
+        if app is not None:
+            return app
+        prefix = query.casefold()
+        apps = [title for title in self._by_title if title.startswith(prefix)]
+        if len(apps) == 1:
+            return self._by_title[apps[0]][0]
+        return None
+
+
+class IconCache(object):
+    """Thread-safe LRU of icon bytes by URL."""
+
+    def __init__(self, maxsize=ICON_CACHE_SIZE):
+        """Initialize an empty cache keeping at most maxsize icons."""
+        self._icons = collections.OrderedDict()
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of cached icons."""
+        return len(self._icons)
+
+    def __contains__(self, url):
+        """Return True if the icon of url is cached."""
+        return url in self._icons
+
+    def get(self, url):
+        """Return the cached icon of url, None if it is not cached."""
+        with self._lock:
+            icon = self._icons.get(url)
+            if icon is not None:
+                self._icons.move_to_end(url)
+            return icon
+
+    def put(self, url, icon):
+        """Cache an icon, dropping the least recently used beyond maxsize."""
+        with self._lock:
+            self._icons[url] = icon
+            self._icons.move_to_end(url)
+            while len(self._icons) > self._maxsize:
+                self._icons.popitem(last=False)
+
+    def clear(self):
+        """Drop all icons."""
+        with self._lock:
+            self._icons.clear()
+
+
+def fetch_icon(url, timeout=ICON_TIMEOUT):
+    """Return the bytes of the icon at url, None if it cannot be fetched."""
+    # Imported here, urllib.request is slow to import and rarely needed.
+    import urllib.request
+
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read()
+    except (OSError, ValueError) as exception_instance:
+        _LOGGER.debug("Fetching icon %s failed: %s", url, exception_instance)
+        return None
@@ -0,0 +1,834 @@
+"""
+Sony Bravia RC API for asyncio.
+
+`AsyncBraviaRC` offers the same methods as `BraviaRC` as coroutines. Requests
+are sent over keep-alive connections opened with asyncio streams, so many
+requests can be in flight without a thread each.
+"""
+import asyncio
+import collections
+import itertools
+import json
+import logging
+import time
+
+from .apps import APP_CATALOG_TTL, App, AppCatalog, fetch_icon
+from .health import (
+    CONNECT_TIMEOUT,
+    CircuitBreaker,
+    TVUnavailableError,
+    split_host,
+)
+from .readcache import AsyncReadCache
+from .sony_bravia_psk import (
+    COMMON_COMMANDS,
+    EXT_INPUT_SOURCES,
+    INVENTORY,
+    POOL_SIZE,
+    TIMEOUT,
+    TV_SOURCES,
+    WAKE_POLL_INTERVAL,
+    WAKE_TIMEOUT,
+    BraviaRCBase,
+)
+from .transport import HTTPError, Response
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _AsyncHTTPConnectionPool(object):
+    """Keep-alive HTTP/1.1 connections to one TV."""
+
+    def __init__(
+        self,
+        host,
+        pool_size=POOL_SIZE,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=TIMEOUT,
+    ):
+        """Initialize the pool."""
+        self._address, self._port = split_host(host)
+        self._host = host
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._idle = []
+        self._semaphore = asyncio.Semaphore(pool_size)
+
+    async def _open(self):
+        return await asyncio.wait_for(
+            asyncio.open_connection(self._address, self._port), self._connect_timeout
+        )
+
+    async def probe(self):
+        """Return True if a TCP connection to the TV can be opened."""
+        try:
+            _, writer = await self._open()
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        return True
+
+    async def close(self):
+        """Close all idle connections."""
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:  # pylint: disable=broad-except
+                pass
+
+    async def post(self, path, data, headers):
+        """Post data to the TV and return the response."""
+        async with self._semaphore:
+            return await self._post(path, data, headers)
+
+    async def _post(self, path, data, headers):
+        """Send the request, once more on a new connection if a reused one fails.
+
+        The TV may have handled the request before resetting the connection,
+        so a request that is not idempotent can then be handled twice.
+        """
+        request = self._build_request(path, data, headers)
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if reader.at_eof() or writer.is_closing():
+                # Closed while idle, nothing was sent on it.
+                writer.close()
+                continue
+            try:
+                response = await asyncio.wait_for(
+                    self._exchange(reader, writer, request), self._read_timeout
+                )
+            except (ConnectionError, asyncio.IncompleteReadError) as exception_instance:
+                # The TV dropped the idle socket, the other idle ones are likely
+                # gone too, retry once on a new connection.
+                _LOGGER.debug(
+                    "Connection dropped, reconnecting: %s", exception_instance
+                )
+                writer.close()
+                while self._idle:
+                    self._idle.pop()[1].close()
+                break
+            else:
+                response.reused = True
+                return response
+        reader, writer = await self._open()
+        response = await asyncio.wait_for(
+            self._exchange(reader, writer, request), self._read_timeout
+        )
+        response.reused = False
+        return response
+
+    def _build_request(self, path, data, headers):
+        lines = [
+            "POST /%s HTTP/1.1" % path,
+            "Host: %s" % self._host,
+            "Content-Length: %d" % len(data),
+            "Connection: keep-alive",
+        ]
+        lines.extend("%s: %s" % item for item in headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data
+
+    async def _exchange(self, reader, writer, request):
+        try:
+            writer.write(request)
+            await writer.drain()
+            response, keep_alive = await self._read_response(reader)
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+        return response
+
+    @staticmethod
+    async def _read_response(reader):
+        status_line = await reader.readuntil(b"\r\n")
+        version, status = status_line.split(b" ", 2)[:2]
+        headers = {}
+        set_cookies = []
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, value = line.decode("latin-1").split(":", 1)
+            name, value = name.strip().lower(), value.strip()
+            if name == "set-cookie":
+                set_cookies.append(value)
+            else:
+                headers[name] = value
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readuntil(b"\r\n")
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            content = b"".join(chunks)
+            keep_alive = True
+        elif "content-length" in headers:
+            content = await reader.readexactly(int(headers["content-length"]))
+            keep_alive = True
+        else:
+            content = await reader.read()
+            keep_alive = False
+
+        connection = headers.get("connection", "").lower()
+        if connection == "close" or (
+            version == b"HTTP/1.0" and connection != "keep-alive"
+        ):
+            keep_alive = False
+        return Response(int(status), headers, content, set_cookies), keep_alive
+
+
+class AsyncBraviaRC(BraviaRCBase):
+    """Representation of a Sony Bravia TV for asyncio."""
+
+    def __init__(
+        self,
+        host,
+        psk,
+        mac=None,
+        pool_size=POOL_SIZE,
+        cache=None,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=TIMEOUT,
+        observer=None,
+        read_ttl=None,
+        wol=None,
+    ):
+        """Initialize the async Sony Bravia RC class."""
+        super().__init__(host, psk, mac, cache, observer, wol)
+        self._read_cache = AsyncReadCache(read_ttl)
+        self.add_command_listener(self._read_cache.invalidate_command)
+        self._pool_size = pool_size
+        self._pool = None
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._breaker = CircuitBreaker()
+        self._apps_task = None
+
+    @property
+    def health(self):
+        """Return the `CircuitBreaker` tracking the reachability of the TV."""
+        return self._breaker
+
+    async def probe(self):
+        """Return True if the TV accepts a TCP connection."""
+        return await self._get_pool().probe()
+
+    async def __aenter__(self):
+        """Enter the runtime context, connections are opened on first use."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Close the connections when leaving the runtime context."""
+        await self.close()
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = _AsyncHTTPConnectionPool(
+                self._host, self._pool_size, self._connect_timeout, self._read_timeout
+            )
+        return self._pool
+
+    async def close(self):
+        """Close all pooled connections to the TV."""
+        if self._apps_task is not None:
+            self._apps_task.cancel()
+            self._apps_task = None
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+        self._read_cache.invalidate()
+
+    async def _check_breaker(self):
+        """Raise TVUnavailableError if the TV is known to be unreachable."""
+        breaker = self._breaker
+        if not breaker.is_open:
+            return
+        if not breaker.allow_trial():
+            raise TVUnavailableError(
+                "%s is unreachable, retrying in %.1fs" % (self._host, breaker.retry_in)
+            )
+        if not await self.probe():
+            breaker.record_failure()
+            raise TVUnavailableError("%s is unreachable" % self._host)
+
+    async def _post(self, path, data, headers, method=None, parse=None):
+        """Post data to the TV and report the request, see `BraviaRC._post`."""
+        if not self._observers:
+            response = await self._send_post(path, data, headers)
+            return response if parse is None else parse(response.content)
+        started = time.perf_counter()
+        try:
+            response = await self._send_post(path, data, headers)
+        except Exception as exception_instance:
+            if isinstance(exception_instance, TVUnavailableError):
+                error = "unavailable"
+            elif isinstance(exception_instance, asyncio.TimeoutError):
+                error = "timeout"
+            else:
+                error = "connection"
+            elapsed = time.perf_counter() - started
+            self._report_request(path, method, data, elapsed, None, None, error, None)
+            raise
+        elapsed = time.perf_counter() - started
+        result = response if parse is None else parse(response.content)
+        self._report_request(
+            path,
+            method,
+            data,
+            elapsed,
+            response.status,
+            response.content,
+            None if parse is None or self._is_result(result) else "api",
+            response.reused,
+        )
+        return result
+
+    async def _send_post(self, path, data, headers):
+        await self._check_breaker()
+        try:
+            response = await self._get_pool().post(path, data, headers)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            self._breaker.record_failure()
+            raise
+        self._breaker.record_success()
+        return response
+
+    async def connect(self, pin, clientid, nickname):
+        """Connect to TV and get authentication cookie, see `BraviaRC.connect`."""
+        authorization = self._register_data(clientid, nickname)
+        headers = self._register_headers(pin)
+
+        try:
+            response = await self._post("sony/accessControl", authorization, headers)
+            response.raise_for_status()
+
+        except HTTPError as exception_instance:
+            _LOGGER.exception("[W] HTTPError: " + str(exception_instance))
+            return False
+
+        except TVUnavailableError as exception_instance:
+            _LOGGER.error("[W] " + str(exception_instance))
+            return False
+
+        except asyncio.TimeoutError as exception_instance:
+            _LOGGER.exception("[W] Timeout occurred: " + str(exception_instance))
+            return False
+
+        except Exception as exception_instance:  # pylint: disable=broad-except
+            _LOGGER.exception("[W] Exception: " + str(exception_instance))
+            return False
+
+        else:
+            resp = response.json()
+            _LOGGER.debug(json.dumps(resp, indent=4))
+            if resp is None or not resp.get("error"):
+                self._cookies = response.cookies
+                return True
+
+        return False
+
+    async def send_req_ircc(self, params, log_errors=True):
+        """Send an IRCC command via HTTP to Sony Bravia."""
+        if params is None:
+            return False
+        return await self._send_ircc_body(self._ircc_body(params), log_errors)
+
+    async def _send_ircc_body(self, data, log_errors=True):
+        try:
+            response = await self._post("sony/IRCC", data, self._ircc_headers())
+        except TVUnavailableError as exception_instance:
+            _LOGGER.debug(str(exception_instance))
+
+        except asyncio.TimeoutError as exception_instance:
+            if log_errors:
+                _LOGGER.error("Timeout occurred: " + str(exception_instance))
+
+        except Exception as exception_instance:  # pylint: disable=broad-except
+            if log_errors:
+                _LOGGER.error("Exception: " + str(exception_instance))
+        else:
+            self._notify_command("IRCC")
+            return response.content
+
+    async def bravia_req_json(self, url, params, log_errors=True):
+        """Send request command via HTTP json to Sony Bravia."""
+        data = self._request_data(params)
+        method = self._request_method(url, data)
+        if method.startswith("get"):
+            return await self._read_cache.get(
+                (method, url, data),
+                lambda: self._send_json(url, method, data, log_errors),
+            )
+        return await self._send_json(url, method, data, log_errors)
+
+    async def _send_json(self, url, method, data, log_errors, request_id=None):
+        if request_id is None:
+            data, request_id = self._number_request(data)
+        try:
+            result = await self._post(
+                url,
+                data,
+                self._json_headers(),
+                method,
+                lambda content: self._parse_json_response(
+                    content, url, data, log_errors, request_id
+                ),
+            )
+        except TVUnavailableError as exception_instance:
+            _LOGGER.debug(str(exception_instance))
+
+        except asyncio.TimeoutError as exception_instance:
+            if log_errors:
+                _LOGGER.error("Timeout occurred: " + str(exception_instance))
+
+        except Exception as exception_instance:  # pylint: disable=broad-except
+            if log_errors:
+                _LOGGER.error("Exception: " + str(exception_instance))
+
+        else:
+            if not method.startswith("get"):
+                # Drop cached reads the write changed and nudge the pollers.
+                self._notify_command(method)
+            return result
+
+    async def batch(self, calls, log_errors=True):
+        """Send JSON-RPC calls with as few round trips as possible.
+
+        See `BraviaRC.batch`, the services are requested concurrently.
+        """
+        request_ids, groups = self._batch_groups(calls)
+        responses = await asyncio.gather(
+            *(
+                self._send_group(path, group, log_errors)
+                for path, group in groups.items()
+            )
+        )
+        return self._demultiplex(request_ids, itertools.chain.from_iterable(responses))
+
+    async def _send_group(self, path, group, log_errors):
+        """Send the requests of one service one after the other."""
+        responses = []
+        for method, request_id, data in group:
+            responses.append(
+                await self._send_json(path, method, data, log_errors, request_id)
+            )
+        return responses
+
+    async def get_inventory(self):
+        """Return everything about the TV, see `BraviaRC.get_inventory`."""
+        return self._parse_inventory(
+            await self.batch(
+                [(service, method, None) for _, service, method in INVENTORY], False
+            )
+        )
+
+    async def send_command(self, command):
+        """Send command to the TV."""
+        payload = self._ircc_payloads.get(command)
+        if payload is not None:
+            return await self._send_ircc_body(payload)
+        return await self.send_req_ircc(await self.get_command_code(command))
+
+    async def prepare_commands(self, command_names=COMMON_COMMANDS):
+        """Resolve the IRCC requests of commands ahead of sending them."""
+        if self._commands_refresh_due():
+            await self._refresh_commands()
+        return self._prepare_payloads(command_names)
+
+    async def load_app_list(self):
+        """Get the list of installed apps, it also updates the app catalog."""
+        resp = await self.bravia_req_json(
+            "sony/appControl", self._jdata_build("getApplicationList")
+        )
+        return self._update_app_catalog(self._parse_app_list(resp))
+
+    async def get_app_catalog(self, max_age=APP_CATALOG_TTL):
+        """Return the app catalog, see `BraviaRC.get_app_catalog`."""
+        catalog = self._apps
+        if catalog is None:
+            await self.load_app_list()
+            return self._apps or AppCatalog()
+        if self._apps_refresh_due(max_age):
+            self._apps_task = asyncio.ensure_future(self._refresh_apps())
+        return catalog
+
+    async def _refresh_apps(self):
+        try:
+            await self.load_app_list()
+        finally:
+            self._apps_refreshing = False
+            self._apps_task = None
+
+    async def open_app_by_name(self, name):
+        """Open the app best matching name, see `BraviaRC.open_app_by_name`."""
+        catalog = self._apps
+        app = (await self.get_app_catalog()).find(name)
+        if (
+            app is None
+            and catalog is not None
+            and await self.load_app_list() is not None
+        ):
+            app = self._apps.find(name)
+        if app is not None:
+            await self.open_app(app.uri)
+        return app
+
+    async def fetch_app_icons(self, apps=None):
+        """Fetch the icons of apps concurrently, see `BraviaRC.fetch_app_icons`."""
+        apps = list(await self.get_app_catalog() if apps is None else apps)
+        missing = self._missing_icons(apps)
+        loop = asyncio.get_running_loop()
+        icons = await asyncio.gather(
+            *(loop.run_in_executor(None, fetch_icon, url) for url in missing)
+        )
+        for url, icon in zip(missing, icons):
+            if icon is not None:
+                self._icons.put(url, icon)
+        return collections.OrderedDict(
+            (app.uri, self._icons.get(app.icon) if app.icon else None) for app in apps
+        )
+
+    async def get_app_icon(self, app):
+        """Return the icon of an app or app name, see `BraviaRC.get_app_icon`."""
+        if not isinstance(app, App):
+            app = (await self.get_app_catalog()).find(app)
+        if app is None:
+            return None
+        return (await self.fetch_app_icons([app]))[app.uri]
+
+    async def open_app(self, uri):
+        """Open app with given uri."""
+        resp = await self.bravia_req_json(
+            "sony/appControl", self._jdata_build("setActiveApp", {"uri": uri})
+        )
+        self._parse_open_app(resp)
+
+    async def get_content_count(self, source):
+        """Return the number of contents of a source, None if unknown."""
+        resp = await self.bravia_req_json(
+            "sony/avContent",
+            self._jdata_build("getContentCount", {"source": source}),
+            log_errors=False,
+        )
+        return self._parse_content_count(resp)
+
+    async def _get_content_range(self, source, start, stop=None):
+        """Return the contents of a source from index start to stop."""
+        original_content_list = []
+        content_index = start
+        while stop is None or content_index < stop:
+            resp = await self.bravia_req_json(
+                "sony/avContent",
+                self._jdata_build(
+                    "getContentList",
+                    self._content_range_params(source, content_index, stop),
+                ),
+            )
+            page = self._parse_content_page(resp)
+            if page is None:
+                break
+            content_index = page[-1]["index"] + 1
+            original_content_list.extend(page)
+        return original_content_list
+
+    def _source_tasks(self, source, count):
+        """Return the coroutines fetching the pages of a source."""
+        if count is None:
+            return [self._get_content_range(source, 0)]
+        return [
+            self._get_content_range(source, start, stop)
+            for start, stop in self._content_ranges(count)
+        ]
+
+    async def get_source(self, source, concurrent=False):
+        """Return list of sources, see `BraviaRC.get_source`."""
+        if not concurrent:
+            return await self._get_content_range(source, 0)
+        count = await self.get_content_count(source)
+        pages = await asyncio.gather(*self._source_tasks(source, count))
+        return [content for page in pages for content in page]
+
+    async def _load_cache_key(self):
+        """Identify the TV in the persistent cache by its model and serial."""
+        if self._cache is not None and self._cache_key is None:
+            self._cache_key = self._cache.make_key(await self.get_system_info())
+        return self._cache_key
+
+    async def invalidate_cache(self):
+        """Drop the command codes and content list, also from the cache."""
+        await self._load_cache_key()
+        self._clear_cached_data()
+
+    async def load_source_list(self, concurrent=False):
+        """Load source list from Sony Bravia, see `BraviaRC.load_source_list`."""
+        await self._load_cache_key()
+        content_list = self._cache_get("content")
+        if content_list is None:
+            if concurrent:
+                pages = await asyncio.gather(*await self._content_tasks())
+            else:
+                pages = [page async for page in self._iter_content_pages()]
+            content_list = [content for page in pages for content in page]
+            if content_list:
+                self._cache_set("content", content_list)
+        return self._build_content_mapping(content_list)
+
+    async def get_channel_directory(self, concurrent=False):
+        """Return the `ChannelDirectory` of the TV, load it if needed.
+
+        An empty directory is loaded again, e.g. when the TV was in standby.
+        """
+        if not self._channels:
+            await self.load_source_list(concurrent)
+        return self._channels
+
+    async def iter_source_list(self, concurrent=False):
+        """Yield the contents of all sources as soon as they are received.
+
+        With concurrent the pages are fetched in parallel and contents are
+        yielded in the order their page arrives, not in channel order.
+        """
+        if concurrent:
+            for future in asyncio.as_completed(await self._content_tasks()):
+                for content in await future:
+                    yield content
+        else:
+            async for page in self._iter_content_pages():
+                for content in page:
+                    yield content
+
+    async def _get_sources(self, scheme, sources):
+        resp = await self.bravia_req_json(
+            "sony/avContent", self._jdata_build("getSourceList", {"scheme": scheme})
+        )
+        return self._parse_source_list(resp, sources)
+
+    async def _get_input_content(self, result):
+        resp = await self.bravia_req_json(
+            "sony/avContent", self._jdata_build("getContentList", result)
+        )
+        return self._parse_input_content(resp)
+
+    async def _iter_content_pages(self):
+        for result in await self._get_sources("tv", TV_SOURCES):
+            yield await self._get_content_range(result["source"], 0)
+        for result in await self._get_sources("extInput", EXT_INPUT_SOURCES):
+            yield await self._get_input_content(result)
+
+    async def _content_tasks(self):
+        """Return the coroutines that together fetch all contents."""
+        tv_sources, input_sources = await asyncio.gather(
+            self._get_sources("tv", TV_SOURCES),
+            self._get_sources("extInput", EXT_INPUT_SOURCES),
+        )
+        counts = await asyncio.gather(
+            *[self.get_content_count(result["source"]) for result in tv_sources]
+        )
+        tasks = []
+        for result, count in zip(tv_sources, counts):
+            tasks.extend(self._source_tasks(result["source"], count))
+        tasks.extend(self._get_input_content(result) for result in input_sources)
+        return tasks
+
+    async def get_playing_info(self):
+        """Get information on program that is shown on TV."""
+        resp = await self.bravia_req_json(
+            "sony/avContent", self._jdata_build("getPlayingContentInfo", None), False
+        )
+        return self._parse_playing_info(resp)
+
+    async def get_power_status(self):
+        """Get power status being off, active, standby or unauthorized."""
+        return_value = "off"  # by default the TV is turned off
+        try:
+            resp = await self.bravia_req_json(
+                "sony/system", self._jdata_build("getPowerStatus", None), False
+            )
+            return_value = self._parse_power_status(resp)
+        except Exception:  # pylint: disable=broad-except
+            pass
+        return return_value
+
+    async def _refresh_commands(self):
+        await self._load_cache_key()
+        commands = self._cache_get("commands")
+        if commands is not None:
+            self._set_commands(commands)
+            return
+        resp = await self.bravia_req_json(
+            "sony/system", self._jdata_build("getRemoteControllerInfo", None)
+        )
+        self._parse_commands(resp)
+        if self._commands:
+            self._cache_set("commands", self._commands)
+
+    async def get_command_code(self, command_name):
+        """Get command code."""
+        if self._commands_refresh_due():
+            await self._refresh_commands()
+        return self._lookup_command_code(command_name)
+
+    async def get_volume_info(self):
+        """Get volume info."""
+        resp = await self.bravia_req_json(
+            "sony/audio",
+            self._jdata_build("getVolumeInformation", None),
+            log_errors=False,
+        )
+        return self._parse_volume_info(resp)
+
+    async def get_system_info(self):
+        """Get info on TV."""
+        resp = await self.bravia_req_json(
+            "sony/system", self._jdata_build("getSystemInformation", None)
+        )
+        return self._parse_system_info(resp)
+
+    async def get_network_info(self):
+        """Get info on network."""
+        resp = await self.bravia_req_json(
+            "sony/system", self._jdata_build("getNetworkSettings", None)
+        )
+        return self._parse_network_info(resp)
+
+    async def get_current_external_input_status(self):
+        """Get current external input status."""
+        resp = await self.bravia_req_json(
+            "sony/avContent",
+            self._jdata_build("getCurrentExternalInputsStatus", None),
+            log_errors=False,
+        )
+        return self._parse_external_input_status(resp)
+
+    async def get_state(self):
+        """Get the state of the TV in one snapshot, see `BraviaRC.get_state`."""
+        power = await self.get_power_status()
+        if power != "active":
+            return self._build_state(power)
+        volume, playing, external_inputs = await asyncio.gather(
+            self.get_volume_info(),
+            self.get_playing_info(),
+            self.get_current_external_input_status(),
+        )
+        return self._build_state(
+            power,
+            {"volume": volume, "playing": playing, "external_inputs": external_inputs},
+        )
+
+    async def set_volume_level(self, volume):
+        """Set volume level, range 0..1."""
+        await self.bravia_req_json(
+            "sony/audio",
+            self._jdata_build("setAudioVolume", self._volume_params(volume)),
+        )
+
+    async def turn_on(
+        self, wait=False, timeout=WAKE_TIMEOUT, interval=WAKE_POLL_INTERVAL, wake=True
+    ):
+        """Turn the media player on, see `BraviaRC.turn_on`."""
+        started = time.monotonic()
+        if wake and self._mac is not None:
+            await self.wol.async_wake_many([self._mac])
+        # Do not report the TV as off for up to BACKOFF_MAX after waking it.
+        self._breaker.retry_now()
+        self._notify_command("WakeOnLan")
+        if wait:
+            return await self.wait_until_on(timeout, interval, started)
+        return None
+
+    async def wait_until_on(
+        self, timeout=WAKE_TIMEOUT, interval=WAKE_POLL_INTERVAL, started=None
+    ):
+        """Wait until the TV reports active, see `BraviaRC.wait_until_on`."""
+        if started is None:
+            started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            if await _AsyncHTTPConnectionPool(
+                self._host, 1, min(self._connect_timeout, interval)
+            ).probe():
+                self._breaker.record_success()
+                self._read_cache.invalidate(("getPowerStatus",))
+                if await self.get_power_status() == "active":
+                    return time.monotonic() - started
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(interval, remaining))
+
+    async def turn_on_command(self):
+        """Turn the media player on using command.
+
+        Only confirmed working on Android, can be used when WOL is not available.
+        """
+        if await self.get_power_status() != "active":
+            await self.send_command("TvPower")
+            await self.bravia_req_json(
+                "sony/system",
+                self._jdata_build("setPowerStatus", {"status": True}),
+                log_errors=False,
+            )
+
+    async def turn_off(self):
+        """Turn off media player."""
+        await self.send_command("PowerOff")
+
+    async def turn_off_command(self):
+        """Turn off media player using the rest-api for Android TV."""
+        await self.bravia_req_json(
+            "sony/system", self._jdata_build("setPowerStatus", {"status": False})
+        )
+
+    async def volume_up(self):
+        """Volume up the media player."""
+        await self.send_command("VolumeUp")
+
+    async def volume_down(self):
+        """Volume down media player."""
+        await self.send_command("VolumeDown")
+
+    async def mute_volume(self):
+        """Send mute command."""
+        await self.send_command("Mute")
+
+    async def select_source(self, source):
+        """Set the input source, see `BraviaRC.select_source`."""
+        channel = (await self.get_channel_directory()).find(source)
+        if channel is not None:
+            await self.play_content(channel.uri)
+
+    async def play_content(self, uri):
+        """Play content by URI."""
+        await self.bravia_req_json(
+            "sony/avContent", self._jdata_build("setPlayContent", {"uri": uri})
+        )
+
+    async def media_play(self):
+        """Send play command."""
+        await self.send_command("Play")
+
+    async def media_pause(self):
+        """Send media pause command to media player."""
+        await self.send_command("Pause")
+
+    async def media_tvpause(self):
+        """Send tv pause command to media player."""
+        await self.send_command("TvPause")
+
+    async def media_next_track(self):
+        """Send next track command."""
+        await self.send_command("Next")
+
+    async def media_previous_track(self):
+        """Send the previous track command."""
+        await self.send_command("Prev")
@@ -0,0 +1,108 @@
+"""Persistent cache of Sony Bravia TV data that rarely changes.
+
+The remote controller codes and the content list of a TV only change after a
+firmware update or a channel scan, but fetching them costs from one to dozens
+of requests. `BraviaCache` keeps them in a JSON file keyed by model and serial
+number so they survive a restart.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+CACHE_TTL = 7 * 24 * 60 * 60  # one week in seconds
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class BraviaCache(object):
+    """JSON file cache shared by any number of TVs."""
+
+    def __init__(self, path, ttl=CACHE_TTL):
+        """Initialize the cache.
+
+        Parameters
+        ---------
+        path: str
+            File the cache is stored in, created when first written.
+        ttl: int
+            Seconds after which a cached value is no longer used.
+        """
+        self._path = path
+        self._ttl = ttl
+        self._data = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(system_info):
+        """Return the cache key of a TV from `get_system_info`, or None."""
+        model = system_info.get("model")
+        serial = system_info.get("serial")
+        if not model or not serial:
+            return None
+        return "%s/%s" % (model, serial)
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self._path, encoding="utf-8") as cache_file:
+                    self._data = json.load(cache_file)
+            except FileNotFoundError:
+                self._data = {}
+            except (OSError, ValueError) as exception_instance:
+                _LOGGER.warning(
+                    "Ignoring unreadable cache %s: %s", self._path, exception_instance
+                )
+                self._data = {}
+        return self._data
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self._path))
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as cache_file:
+                json.dump(self._data, cache_file, separators=(",", ":"))
+            os.replace(temp_path, self._path)
+        except OSError as exception_instance:
+            _LOGGER.warning(
+                "Unable to write cache %s: %s", self._path, exception_instance
+            )
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def get(self, key, name):
+        """Return the cached value, None when missing or expired."""
+        with self._lock:
+            entry = self._load().get(key, {}).get(name)
+        if entry is None or time.time() - entry["time"] > self._ttl:
+            return None
+        return entry["value"]
+
+    def set(self, key, name, value):
+        """Store a value and write the cache file."""
+        with self._lock:
+            self._load().setdefault(key, {})[name] = {
+                "time": time.time(),
+                "value": value,
+            }
+            self._save()
+
+    def invalidate(self, key=None, name=None):
+        """Drop cached values.
+
+        Without arguments everything is dropped, with a key only the values of
+        that TV and with a key and name only that value.
+        """
+        with self._lock:
+            data = self._load()
+            if key is None:
+                data.clear()
+            elif name is None:
+                data.pop(key, None)
+            else:
+                data.get(key, {}).pop(name, None)
+            self._save()
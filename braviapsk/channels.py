@@ -0,0 +1,197 @@
+"""Indexed directory of the channels and inputs of a Sony Bravia TV.
+
+`ChannelDirectory` keeps the getContentList results as slotted `Channel`
+records and indexes them by URI, display number, source and title. Titles and
+display numbers are kept in sorted arrays, so exact, case-insensitive and
+prefix lookups are a binary search and duplicate titles do not hide each
+other.
+"""
+import array
+import bisect
+import collections
+import sys
+
+
+class Channel(object):
+    """A channel or input of the TV."""
+
+    __slots__ = ("uri", "title", "source", "index", "disp_num", "media_type")
+
+    def __init__(self, uri, title, source, index, disp_num=None, media_type=None):
+        """Initialize the channel."""
+        self.uri = uri
+        self.title = title
+        self.source = source
+        self.index = index
+        self.disp_num = disp_num
+        self.media_type = media_type
+
+    def __repr__(self):
+        """Return a readable representation."""
+        return "Channel(%r, %r, disp_num=%r)" % (self.title, self.uri, self.disp_num)
+
+    @classmethod
+    def from_content(cls, content, strings):
+        """Create a channel from a getContentList item.
+
+        strings is a dict used to share equal source and media type strings.
+        """
+        uri = content["uri"]
+        source = uri.split("?", 1)[0]
+        media_type = content.get("programMediaType")
+        return cls(
+            uri,
+            content.get("title", ""),
+            strings.setdefault(source, source),
+            content.get("index"),
+            content.get("dispNum"),
+            strings.setdefault(media_type, media_type),
+        )
+
+
+class _SortedIndex(object):
+    """Keys sorted next to the positions of their channels."""
+
+    __slots__ = ("keys", "positions")
+
+    def __init__(self, pairs):
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.positions = array.array("I", (position for _, position in pairs))
+
+    def find(self, key):
+        """Return the positions of key, in directory order."""
+        start = bisect.bisect_left(self.keys, key)
+        stop = bisect.bisect_right(self.keys, key, start)
+        return self.positions[start:stop]
+
+    def prefix(self, prefix):
+        """Return the positions of the keys starting with prefix."""
+        start = bisect.bisect_left(self.keys, prefix)
+        stop = start
+        while stop < len(self.keys) and self.keys[stop].startswith(prefix):
+            stop += 1
+        return self.positions[start:stop]
+
+
+class ChannelDirectory(object):
+    """Channels and inputs of one TV, in TV order, with lookup indexes."""
+
+    def __init__(self, content_list=()):
+        """Index a content list as returned by getContentList."""
+        strings = {}
+        self._channels = [
+            Channel.from_content(content, strings)
+            for content in content_list
+            if "uri" in content
+        ]
+        self._by_uri = {channel.uri: channel for channel in self._channels}
+        self._sources = collections.OrderedDict()
+        titles = []
+        disp_nums = []
+        for position, channel in enumerate(self._channels):
+            self._sources.setdefault(channel.source, array.array("I")).append(position)
+            title = channel.title
+            folded = title.casefold()
+            titles.append((folded if folded != title else title, position))
+            if channel.disp_num is not None:
+                disp_nums.append((channel.disp_num, position))
+        self._titles = _SortedIndex(titles)
+        self._disp_nums = _SortedIndex(disp_nums)
+
+    def __len__(self):
+        """Return the number of channels."""
+        return len(self._channels)
+
+    def __iter__(self):
+        """Iterate over the channels in TV order."""
+        return iter(self._channels)
+
+    def _at(self, positions):
+        return [self._channels[position] for position in sorted(positions)]
+
+    @property
+    def sources(self):
+        """Return the sources of the channels, in TV order."""
+        return list(self._sources)
+
+    def by_uri(self, uri):
+        """Return the channel with the given URI, None if unknown."""
+        return self._by_uri.get(uri)
+
+    def by_disp_num(self, disp_num, source=None):
+        """Return the channels shown with the given number, optionally of a source."""
+        channels = self._at(self._disp_nums.find(disp_num))
+        if source is not None:
+            channels = [channel for channel in channels if channel.source == source]
+        return channels
+
+    def by_source(self, source):
+        """Return the channels of a source, e.g. tv:dvbc or extInput:hdmi."""
+        return self._at(self._sources.get(source, ()))
+
+    def by_title(self, title, ignore_case=True):
+        """Return the channels with the given title."""
+        channels = self._at(self._titles.find(title.casefold()))
+        if not ignore_case:
+            channels = [channel for channel in channels if channel.title == title]
+        return channels
+
+    def search(self, prefix, limit=None):
+        """Return the channels of which the title starts with prefix, ignoring case."""
+        channels = self._at(self._titles.prefix(prefix.casefold()))
+        return channels[:limit] if limit is not None else channels
+
+    def find(self, query):
+        """Return the channel best matching query, None if there is none.
+
+        Tries in turn the exact title, the title ignoring case, the URI, the
+        display number and a title prefix matching a single channel. Of
+        several channels with the same title the first one in TV order wins.
+        """
+        channels = self.by_title(query)
+        exact = [channel for channel in channels if channel.title == query]
+        if exact or channels:
+            return (exact or channels)[0]
+        channel = self.by_uri(query)
+        if channel is not None:
+            return channel
+        channels = self.by_disp_num(query)
+        if channels:
+            return channels[0]
+        channels = self.search(query, 2)
+        if len(channels) == 1:
+            return channels[0]
+        return None
+
+    def to_mapping(self):
+        """Return the title to URI mapping returned by `load_source_list`.
+
+        Like `find` it maps a title shared by several channels to the first one.
+        """
+        mapping = collections.OrderedDict()
+        for channel in self._channels:
+            mapping.setdefault(channel.title, channel.uri)
+        return mapping
+
+    def memory_usage(self):
+        """Return the approximate bytes used by the directory and its strings."""
+        seen = set()
+
+        def size(obj):
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            return sys.getsizeof(obj)
+
+        total = size(self._channels) + size(self._by_uri) + size(self._sources)
+        for channel in self._channels:
+            total += size(channel)
+            for name in Channel.__slots__:
+                total += size(getattr(channel, name))
+        for positions in self._sources.values():
+            total += size(positions)
+        for index in (self._titles, self._disp_nums):
+            total += size(index) + size(index.keys) + size(index.positions)
+            total += sum(size(key) for key in index.keys)
+        return total
@@ -0,0 +1,301 @@
+"""Discovery of Sony Bravia TVs on the local network.
+
+`BraviaDiscovery` finds TVs in two ways at the same time: an SSDP M-SEARCH for
+the ScalarWebAPI service the TVs announce, and optionally a scan of whole
+networks that sends /sony/system requests to every address with an open port,
+with a bounded number of probes in flight and short timeouts. Every TV found
+is identified in one round of requests and returned as a config dict that
+`BraviaFleet` and `BraviaRC.from_config` accept as is, once it has a PSK.
+"""
+import collections
+import ipaddress
+import logging
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .health import probe, split_host
+from .sony_bravia_psk import BraviaRC
+
+SSDP_ADDRESS = ("239.255.255.250", 1900)
+SSDP_TARGET = "urn:schemas-sony-com:service:ScalarWebAPI:1"
+SSDP_TIMEOUT = 2  # seconds to collect SSDP answers
+SSDP_REPEAT = 2  # number of M-SEARCH packets sent, UDP may be lost
+PROBE_TIMEOUT = 0.3  # seconds to wait for a TCP connection while scanning
+IDENTIFY_TIMEOUT = 2  # seconds to wait for the answers of a TV
+MAX_PROBES = 64  # maximum number of addresses probed at the same time
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _m_search(target, mx):
+    return (
+        "M-SEARCH * HTTP/1.1\r\n"
+        "HOST: %s:%d\r\n"
+        'MAN: "ssdp:discover"\r\n'
+        "MX: %d\r\n"
+        "ST: %s\r\n\r\n" % (SSDP_ADDRESS[0], SSDP_ADDRESS[1], mx, target)
+    ).encode("ascii")
+
+
+def parse_ssdp_response(data):
+    """Return the headers of an SSDP answer with lower case names, None if invalid."""
+    lines = data.decode("latin-1").split("\r\n")
+    if not lines[0].startswith("HTTP/1.1 200"):
+        return None
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if value:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def parse_description(xml):
+    """Return (base URL, services, friendly name) of a UPnP device description.
+
+    The values are None, an empty list and None when the description does not
+    announce the Sony ScalarWebAPI.
+    """
+    # Imported here, only needed when TVs answer the SSDP search.
+    import xml.etree.ElementTree as ElementTree  # pylint: disable=import-outside-toplevel
+
+    base_url = None
+    services = []
+    name = None
+    for element in ElementTree.fromstring(xml).iter():
+        tag = element.tag.rsplit("}", 1)[-1]
+        text = (element.text or "").strip()
+        if tag == "X_ScalarWebAPI_BaseURL":
+            base_url = text
+        elif tag == "X_ScalarWebAPI_ServiceType" and text:
+            services.append(text)
+        elif tag == "friendlyName" and name is None:
+            name = text
+    return base_url, services, name
+
+
+def _host_of_url(url):
+    """Return the host[:port] of an http URL, without the default port."""
+    # Imported here, urllib.parse is only needed for SSDP answers.
+    from urllib.parse import urlsplit  # pylint: disable=import-outside-toplevel
+
+    parts = urlsplit(url)
+    if parts.port in (None, 80):
+        return parts.hostname
+    return "%s:%d" % (parts.hostname, parts.port)
+
+
+def _arp_table():
+    """Return the MAC addresses of the neighbours by IP address, Linux only."""
+    try:
+        with open("/proc/net/arp") as arp:
+            lines = arp.read().splitlines()[1:]
+    except OSError:
+        return {}
+    table = {}
+    for line in lines:
+        fields = line.split()
+        if len(fields) >= 4 and fields[3] != "00:00:00:00:00:00":
+            table[fields[0]] = fields[3]
+    return table
+
+
+class BraviaDiscovery(object):
+    """Find the Sony Bravia TVs of the local network."""
+
+    def __init__(
+        self,
+        psk=None,
+        ssdp_address=SSDP_ADDRESS,
+        ssdp_timeout=SSDP_TIMEOUT,
+        probe_timeout=PROBE_TIMEOUT,
+        identify_timeout=IDENTIFY_TIMEOUT,
+        max_probes=MAX_PROBES,
+        port=80,
+    ):
+        """Initialize the discovery.
+
+        Parameters
+        ---------
+        psk: str
+            Pre-shared key of the TVs. Without it model, serial and MAC are
+            only found where the TV tells them without authentication.
+        ssdp_address: tuple
+            Where M-SEARCH is sent, the SSDP multicast group by default.
+        ssdp_timeout: float
+            Seconds to collect SSDP answers.
+        probe_timeout: float
+            Seconds to wait for a connection to a scanned address.
+        identify_timeout: float
+            Seconds to wait for the answers of a TV.
+        max_probes: int
+            Maximum number of addresses probed at the same time.
+        port: int
+            Port of the scanned TVs.
+        """
+        self._psk = psk
+        self._ssdp_address = ssdp_address
+        self._ssdp_timeout = ssdp_timeout
+        self._probe_timeout = probe_timeout
+        self._identify_timeout = identify_timeout
+        self._max_probes = max_probes
+        self._port = port
+
+    def search(self):
+        """Send an SSDP M-SEARCH and return the description URLs that answered."""
+        locations = []
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+            message = _m_search(SSDP_TARGET, max(1, int(self._ssdp_timeout)))
+            for _ in range(SSDP_REPEAT):
+                sock.sendto(message, self._ssdp_address)
+            deadline = time.monotonic() + self._ssdp_timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    data, _ = sock.recvfrom(4096)
+                except socket.timeout:
+                    break
+                headers = parse_ssdp_response(data)
+                location = headers and headers.get("location")
+                if location and location not in locations:
+                    locations.append(location)
+        except OSError as exception_instance:
+            _LOGGER.debug("SSDP search failed: %s", exception_instance)
+        finally:
+            sock.close()
+        return locations
+
+    def describe(self, location):
+        """Return (host, services, name) of the TV of a description URL."""
+        # Imported here, urllib.request is slow to import.
+        import urllib.request  # pylint: disable=import-outside-toplevel
+
+        try:
+            with urllib.request.urlopen(
+                location, timeout=self._identify_timeout
+            ) as response:
+                base_url, services, name = parse_description(response.read())
+        except (OSError, ValueError, SyntaxError) as exception_instance:
+            _LOGGER.debug("No description at %s: %s", location, exception_instance)
+            return _host_of_url(location), None, None
+        return _host_of_url(base_url or location), services or None, name
+
+    def identify(self, host, services=None, name=None, arp=None):
+        """Return the config of the Bravia TV at host, None if it is not one.
+
+        The config is a dict with host, psk, mac, model, serial, name and
+        services. services are requested from the TV when not given. psk is
+        None without the PSK of the discovery, set it before using the config.
+        """
+        braviarc = BraviaRC(
+            host,
+            self._psk or "",
+            pool_size=1,
+            connect_timeout=self._probe_timeout,
+            read_timeout=self._identify_timeout,
+        )
+        with braviarc:
+            calls = [("system", "getInterfaceInformation", None)]
+            if self._psk is not None:
+                calls.append(("system", "getSystemInformation", None))
+            if services is None:
+                calls.append(("guide", "getServiceProtocols", None))
+            responses = dict(
+                zip(
+                    (method for _, method, _ in calls),
+                    braviarc.batch(calls, log_errors=False),
+                )
+            )
+        interface = _result(responses["getInterfaceInformation"]) or {}
+        if interface.get("productCategory") != "tv":
+            return None
+        system = _result(responses.get("getSystemInformation")) or {}
+        if services is None:
+            protocols = (responses.get("getServiceProtocols") or {}).get("result")
+            services = [item[0] for item in protocols or () if item]
+        mac = system.get("macAddr") or system.get("mac")
+        if not mac:
+            mac = (_arp_table() if arp is None else arp).get(split_host(host)[0])
+        return {
+            "host": host,
+            "psk": self._psk,
+            "mac": mac,
+            "model": system.get("model") or interface.get("modelName"),
+            "serial": system.get("serial"),
+            "name": system.get("name") or name or interface.get("productName"),
+            "services": services,
+        }
+
+    def _addresses(self, networks):
+        for network in networks:
+            for address in ipaddress.ip_network(network, strict=False).hosts():
+                yield str(address)
+
+    def _host(self, address):
+        if self._port == 80:
+            return address
+        return "%s:%d" % (address, self._port)
+
+    def _probe(self, address):
+        """Return the config of a TV at address, None if there is none."""
+        host = self._host(address)
+        if not probe(host, self._probe_timeout):
+            return None
+        return self.identify(host)
+
+    def scan(self, networks):
+        """Return the configs of the TVs of networks like 192.168.1.0/24."""
+        with ThreadPoolExecutor(
+            max_workers=self._max_probes, thread_name_prefix="braviascan"
+        ) as executor:
+            return [
+                config
+                for config in executor.map(self._probe, self._addresses(networks))
+                if config is not None
+            ]
+
+    def discover(self, networks=(), ssdp=True):
+        """Return the configs of the TVs found by SSDP and by scanning networks.
+
+        Both run at the same time, a TV found by both is identified once. The
+        configs are sorted by host, see `identify`.
+        """
+        with ThreadPoolExecutor(
+            max_workers=self._max_probes, thread_name_prefix="braviadiscovery"
+        ) as executor:
+            search = executor.submit(self.search) if ssdp else None
+            configs = collections.OrderedDict(
+                (config["host"], config)
+                for config in executor.map(self._probe, self._addresses(networks))
+                if config is not None
+            )
+            if search is not None:
+                described = [
+                    description
+                    for description in executor.map(self.describe, search.result())
+                    if description[0] not in configs
+                ]
+                for config in executor.map(
+                    lambda description: self.identify(*description), described
+                ):
+                    if config is not None:
+                        configs.setdefault(config["host"], config)
+        return [configs[host] for host in sorted(configs)]
+
+
+def _result(response):
+    """Return the first result of a JSON-RPC response, None on errors."""
+    if not response or "error" in response or not response.get("result"):
+        return None
+    return response["result"][0]
+
+
+def discover(psk=None, networks=(), ssdp=True, **kwargs):
+    """Return the configs of the TVs on the network, see `BraviaDiscovery`."""
+    return BraviaDiscovery(psk, **kwargs).discover(networks, ssdp)
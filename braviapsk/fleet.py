@@ -0,0 +1,168 @@
+"""Manage many Sony Bravia TVs at once.
+
+`BraviaFleet` polls and commands a group of TVs concurrently on a bounded
+thread pool, so a sweep takes about as long as the slowest TV instead of the
+sum of all of them.
+"""
+import collections
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .sony_bravia_psk import WAKE_TIMEOUT, BraviaRC
+
+MAX_WORKERS = 16  # maximum number of TVs talked to at the same time
+
+_LOGGER = logging.getLogger(__name__)
+
+FleetResult = collections.namedtuple(
+    "FleetResult", ["host", "value", "error", "elapsed"]
+)
+FleetResult.__doc__ = """Outcome of one call on one TV, elapsed is in seconds."""
+
+
+class BraviaFleet(object):
+    """A group of Sony Bravia TVs handled as one."""
+
+    def __init__(self, tvs, max_workers=MAX_WORKERS, cache=None, observer=None):
+        """Initialize the fleet.
+
+        Parameters
+        ---------
+        tvs: iterable
+            Either `BraviaRC` instances or configs, dicts with the keys host,
+            psk and optionally mac and groups (a list of group names), see
+            `BraviaRC.from_config`. Every host may only appear once and every
+            config needs a PSK, ValueError is raised otherwise.
+        max_workers: int
+            Maximum number of TVs talked to at the same time.
+        cache: BraviaCache
+            Optional persistent cache shared by the TVs created from dicts.
+        observer: callable
+            Optional request observer, e.g. a `BraviaStats`, of the TVs created
+            from dicts.
+        """
+        self._tvs = collections.OrderedDict()
+        self._groups = collections.defaultdict(list)
+        for tv in tvs:
+            host = tv.host if isinstance(tv, BraviaRC) else tv["host"]
+            if host in self._tvs:
+                raise ValueError("TV %s is in the fleet more than once" % host)
+            if isinstance(tv, BraviaRC):
+                braviarc, groups = tv, ()
+            else:
+                braviarc = BraviaRC.from_config(tv, cache=cache, observer=observer)
+                groups = tv.get("groups", ())
+            self._tvs[braviarc.host] = braviarc
+            for group in groups:
+                self._groups[group].append(braviarc.host)
+        self._max_workers = max_workers
+        self._executor = None
+
+    def __enter__(self):
+        """Enter the runtime context."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the fleet when leaving the runtime context."""
+        self.close()
+
+    def __len__(self):
+        """Return the number of TVs in the fleet."""
+        return len(self._tvs)
+
+    def __getitem__(self, host):
+        """Return the `BraviaRC` of the given host."""
+        return self._tvs[host]
+
+    def hosts(self, group=None):
+        """Return the hosts in the fleet, or in the given group."""
+        if group is None:
+            return list(self._tvs)
+        return list(self._groups.get(group, []))
+
+    def close(self):
+        """Stop the worker threads and close all connections."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for braviarc in self._tvs.values():
+            braviarc.close()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="braviafleet"
+            )
+        return self._executor
+
+    def _call(self, host, function):
+        start = time.monotonic()
+        try:
+            value = function(self._tvs[host])
+        except Exception as exception_instance:  # pylint: disable=broad-except
+            _LOGGER.debug("Call on %s failed: %s", host, exception_instance)
+            return FleetResult(host, None, exception_instance, time.monotonic() - start)
+        return FleetResult(host, value, None, time.monotonic() - start)
+
+    def run(self, function, group=None):
+        """Call function(braviarc) on every TV concurrently.
+
+        Returns an ordered dict of host to `FleetResult`. Exceptions raised by
+        function are stored in the result instead of being raised.
+        """
+        executor = self._get_executor()
+        futures = collections.OrderedDict(
+            (host, executor.submit(self._call, host, function))
+            for host in self.hosts(group)
+        )
+        return collections.OrderedDict(
+            (host, future.result()) for host, future in futures.items()
+        )
+
+    def broadcast(self, method, *args, **kwargs):
+        """Call the named `BraviaRC` method on every TV concurrently.
+
+        The keyword argument group limits the call to the TVs of that group.
+        """
+        group = kwargs.pop("group", None)
+        return self.run(
+            lambda braviarc: getattr(braviarc, method)(*args, **kwargs), group
+        )
+
+    def poll(self, group=None):
+        """Get the state of every TV concurrently.
+
+        The value of each result is the `BraviaState` returned by get_state.
+        """
+        return self.run(lambda braviarc: braviarc.get_state(), group)
+
+    def inventory(self, group=None):
+        """Get the inventory of every TV concurrently, see `BraviaRC.get_inventory`."""
+        return self.run(lambda braviarc: braviarc.get_inventory(), group)
+
+    def send_command(self, command, group=None):
+        """Send a command to every TV concurrently."""
+        return self.broadcast("send_command", command, group=group)
+
+    def select_source(self, source, group=None):
+        """Select the input source on every TV concurrently."""
+        return self.broadcast("select_source", source, group=group)
+
+    def turn_on(self, group=None, wait=False, timeout=WAKE_TIMEOUT):
+        """Turn on every TV concurrently.
+
+        The wake-on-LAN packets of all TVs are sent in one batch. With wait the
+        value of each result is the seconds the TV took to be active, None if
+        it was not active after timeout seconds.
+        """
+        batches = collections.OrderedDict()
+        for host in self.hosts(group):
+            braviarc = self._tvs[host]
+            if braviarc.mac is not None:
+                batches.setdefault(braviarc.wol, []).append(braviarc.mac)
+        for wol, macs in batches.items():
+            wol.wake_many(macs)
+        return self.run(
+            lambda braviarc: braviarc.turn_on(wait, timeout, wake=False), group
+        )
@@ -0,0 +1,116 @@
+"""Reachability tracking of Sony Bravia TVs.
+
+A TV that is unplugged does not refuse connections, it just does not answer,
+so every request waits for the full timeout. `CircuitBreaker` remembers that a
+TV failed and makes requests fail immediately until a cheap TCP probe shows
+the TV is back.
+"""
+import socket
+import threading
+import time
+
+CONNECT_TIMEOUT = 2  # timeout in seconds to set up a connection
+FAILURE_THRESHOLD = 3  # consecutive failures after which the breaker opens
+BACKOFF_MIN = 1  # seconds before the first retry of an open breaker
+BACKOFF_MAX = 60  # maximum seconds between retries, doubled on every failure
+
+
+class TVUnavailableError(Exception):
+    """Raised instead of sending a request to a TV known to be unreachable."""
+
+
+def split_host(host, default_port=80):
+    """Split a host in address and port."""
+    if ":" in host:
+        address, port = host.rsplit(":", 1)
+        return address, int(port)
+    return host, default_port
+
+
+def probe(host, timeout=CONNECT_TIMEOUT):
+    """Return True if a TCP connection to the host can be opened."""
+    try:
+        socket.create_connection(split_host(host), timeout=timeout).close()
+    except OSError:
+        return False
+    return True
+
+
+class CircuitBreaker(object):
+    """Track consecutive failures of one TV.
+
+    After failure_threshold consecutive failures the breaker opens and requests
+    are refused. Once the backoff has passed a single trial is allowed; when
+    it fails the backoff doubles, up to backoff_max.
+    """
+
+    def __init__(
+        self,
+        failure_threshold=FAILURE_THRESHOLD,
+        backoff_min=BACKOFF_MIN,
+        backoff_max=BACKOFF_MAX,
+    ):
+        """Initialize a closed breaker."""
+        self._failure_threshold = failure_threshold
+        self._backoff_min = backoff_min
+        self._backoff_max = backoff_max
+        self._failures = 0
+        self._backoff = 0
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    @property
+    def failures(self):
+        """Return the number of consecutive failures."""
+        return self._failures
+
+    @property
+    def is_open(self):
+        """Return True if requests are refused until the next trial."""
+        return self._failures >= self._failure_threshold
+
+    @property
+    def retry_in(self):
+        """Return the seconds until the next trial, 0 if closed."""
+        if not self.is_open:
+            return 0
+        return max(0, self._retry_at - time.monotonic())
+
+    def allow_trial(self):
+        """Return True if an open breaker may try the TV again.
+
+        Only one caller gets the trial, others are refused until the trial
+        has been recorded as failed or succeeded.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._retry_at:
+                return False
+            self._retry_at = now + self._backoff
+            return True
+
+    def retry_now(self):
+        """Allow a trial with the next request and restart the backoff.
+
+        Used after waking the TV, which is likely to answer again soon.
+        """
+        with self._lock:
+            self._backoff = 0
+            self._retry_at = 0
+
+    def record_success(self):
+        """Close the breaker."""
+        with self._lock:
+            self._failures = 0
+            self._backoff = 0
+            self._retry_at = 0
+
+    def record_failure(self):
+        """Count a failure, open the breaker or extend its backoff."""
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self._failure_threshold:
+                self._backoff = min(
+                    max(self._backoff * 2, self._backoff_min), self._backoff_max
+                )
+                self._retry_at = time.monotonic() + self._backoff
@@ -0,0 +1,169 @@
+"""Request metrics of Sony Bravia TVs.
+
+Every request sent by `BraviaRC` or `AsyncBraviaRC` is reported to their
+observers as a `RequestEvent`. `BraviaStats` is an observer that aggregates
+the events per host and JSON-RPC method into latency histograms and counters,
+and exports them in the Prometheus text format.
+"""
+import bisect
+import collections
+import threading
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+RequestEvent = collections.namedtuple(
+    "RequestEvent",
+    [
+        "host",
+        "service",
+        "method",
+        "elapsed",
+        "bytes_out",
+        "bytes_in",
+        "status",
+        "error",
+        "reused",
+    ],
+)
+RequestEvent.__doc__ = """One request sent to a TV.
+
+error is None, "timeout", "connection", "unavailable" (refused by the circuit
+breaker), "http" (HTTP error status) or "api" (JSON-RPC error response, or a
+body that is not a JSON-RPC response).
+reused tells whether a pooled connection was used, None if unknown.
+"""
+
+
+class _MethodStats(object):
+    """Aggregated statistics of one method on one host."""
+
+    __slots__ = ("buckets", "count", "sum", "errors", "bytes_out", "bytes_in")
+
+    def __init__(self, bucket_count):
+        self.buckets = [0] * (bucket_count + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = collections.Counter()
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+
+class BraviaStats(object):
+    """Observer aggregating `RequestEvent` by host, service and method.
+
+    Pass it as observer to `BraviaRC`, one instance can be shared by any
+    number of TVs.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Initialize empty statistics."""
+        self._buckets = tuple(buckets)
+        self._methods = {}
+        self._connections = collections.defaultdict(collections.Counter)
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        """Record a request event."""
+        with self._lock:
+            key = (event.host, event.service, event.method)
+            stats = self._methods.get(key)
+            if stats is None:
+                stats = self._methods[key] = _MethodStats(len(self._buckets))
+            stats.buckets[bisect.bisect_left(self._buckets, event.elapsed)] += 1
+            stats.count += 1
+            stats.sum += event.elapsed
+            stats.bytes_out += event.bytes_out
+            stats.bytes_in += event.bytes_in
+            if event.error is not None:
+                stats.errors[event.error] += 1
+            if event.reused is not None:
+                self._connections[event.host][
+                    "reused" if event.reused else "opened"
+                ] += 1
+
+    def reset(self):
+        """Forget all recorded events."""
+        with self._lock:
+            self._methods.clear()
+            self._connections.clear()
+
+    def snapshot(self):
+        """Return the statistics as a dict keyed by host, then "service/method"."""
+        result = collections.defaultdict(dict)
+        with self._lock:
+            for (host, service, method), stats in self._methods.items():
+                result[host]["%s/%s" % (service, method)] = {
+                    "count": stats.count,
+                    "sum": stats.sum,
+                    "buckets": dict(zip(self._buckets + ("+Inf",), stats.buckets)),
+                    "errors": dict(stats.errors),
+                    "bytes_out": stats.bytes_out,
+                    "bytes_in": stats.bytes_in,
+                }
+            connections = {
+                host: dict(counter) for host, counter in self._connections.items()
+            }
+        return {"methods": dict(result), "connections": connections}
+
+    def to_prometheus(self, prefix="bravia"):
+        """Return the statistics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            methods = sorted(self._methods.items())
+            connections = sorted(
+                (host, dict(counter)) for host, counter in self._connections.items()
+            )
+
+            name = "%s_request_duration_seconds" % prefix
+            lines.append("# HELP %s Latency of requests to the TV." % name)
+            lines.append("# TYPE %s histogram" % name)
+            for (host, service, method), stats in methods:
+                labels = 'host="%s",service="%s",method="%s"' % (host, service, method)
+                cumulative = 0
+                for bound, count in zip(self._buckets + ("+Inf",), stats.buckets):
+                    cumulative += count
+                    lines.append(
+                        '%s_bucket{%s,le="%s"} %d' % (name, labels, bound, cumulative)
+                    )
+                lines.append("%s_sum{%s} %r" % (name, labels, stats.sum))
+                lines.append("%s_count{%s} %d" % (name, labels, stats.count))
+
+            name = "%s_request_errors_total" % prefix
+            lines.append("# HELP %s Failed requests by kind of error." % name)
+            lines.append("# TYPE %s counter" % name)
+            for (host, service, method), stats in methods:
+                for kind, count in sorted(stats.errors.items()):
+                    lines.append(
+                        '%s{host="%s",service="%s",method="%s",kind="%s"} %d'
+                        % (name, host, service, method, kind, count)
+                    )
+
+            for direction, help_text in (
+                ("out", "Bytes sent to the TV."),
+                ("in", "Bytes received from the TV."),
+            ):
+                name = "%s_request_bytes_%s_total" % (prefix, direction)
+                lines.append("# HELP %s %s" % (name, help_text))
+                lines.append("# TYPE %s counter" % name)
+                for (host, service, method), stats in methods:
+                    lines.append(
+                        '%s{host="%s",service="%s",method="%s"} %d'
+                        % (
+                            name,
+                            host,
+                            service,
+                            method,
+                            getattr(stats, "bytes_" + direction),
+                        )
+                    )
+
+            name = "%s_connections_total" % prefix
+            lines.append("# HELP %s Requests by new or reused connection." % name)
+            lines.append("# TYPE %s counter" % name)
+            for host, counter in connections:
+                for kind, count in sorted(counter.items()):
+                    lines.append(
+                        '%s{host="%s",connection="%s"} %d' % (name, host, kind, count)
+                    )
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,810 @@
+"""Local stand-in for a Sony Bravia TV.
+
+`MockBraviaServer` answers the JSON-RPC services and the IRCC endpoint the
+client uses, with configurable latency, errors, power state and number of
+channels. Power, volume and playing content changes are pushed to websocket
+clients that enabled the notifications. It is meant for benchmarks and for
+trying the client without a TV:
+
+    with MockBraviaServer(channels={"tv:dvbc": 2000}, latency=0.01) as server:
+        braviarc = BraviaRC(server.host, server.psk)
+
+With ssdp_port it also answers SSDP M-SEARCH like a TV on the network, for
+trying `BraviaDiscovery`.
+
+It can also be started on its own with `python -m braviapsk.mock_server`.
+"""
+import argparse
+import collections
+import json
+import random
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .websocket import WebSocket, WebSocketError, accept_key
+
+PSK = "0000"
+MODEL = "KD-55XE9005"
+CHANNELS = {"tv:dvbc": 100, "tv:dvbt": 20}
+INPUTS = 4
+COMMANDS = (
+    "PowerOff",
+    "TvPower",
+    "VolumeUp",
+    "VolumeDown",
+    "Mute",
+    "Play",
+    "Pause",
+    "TvPause",
+    "Next",
+    "Prev",
+    "Home",
+    "Confirm",
+    "Up",
+    "Down",
+    "Left",
+    "Right",
+)
+APPS = ("Netflix", "YouTube", "Prime Video", "Spotify", "Plex", "Kodi")
+PAGE_SIZE = 50  # default cnt of getContentList
+PAGE_SIZE_MAX = 200
+
+ERROR_DISPLAY_OFF = [40005, "Display Is Turned off"]
+ERROR_NOT_POWER_ON = [40000, "not power-on"]
+ERROR_ILLEGAL_STATE = [7, "Illegal State"]
+ERROR_NO_SUCH_METHOD = [12, "No Such Method"]
+ERROR_FORBIDDEN = [403, "Forbidden"]
+ERROR_INTERNAL = [500, "Internal Server Error"]
+
+# notifications offered per service
+NOTIFICATIONS = {
+    "system": ("notifyPowerStatus",),
+    "audio": ("notifyVolumeInformation",),
+    "avContent": ("notifyPlayingContentInfo", "notifyExternalInputStatus"),
+}
+# method or IRCC command: notification sent after it
+_PUSHED_BY = {
+    "setPowerStatus": "notifyPowerStatus",
+    "PowerOff": "notifyPowerStatus",
+    "TvPower": "notifyPowerStatus",
+    "setAudioVolume": "notifyVolumeInformation",
+    "VolumeUp": "notifyVolumeInformation",
+    "VolumeDown": "notifyVolumeInformation",
+    "Mute": "notifyVolumeInformation",
+    "setPlayContent": "notifyPlayingContentInfo",
+}
+
+# methods a TV answers without the PSK
+PUBLIC_METHODS = ("getInterfaceInformation", "getServiceProtocols")
+SERVICES = ("system", "audio", "avContent", "appControl", "guide", "accessControl")
+SSDP_TARGET = "urn:schemas-sony-com:service:ScalarWebAPI:1"
+
+_IRCC_CODE = re.compile(rb"<IRCCCode>([^<]*)</IRCCCode>")
+_ST = re.compile(rb"^ST:\s*(\S+)", re.IGNORECASE | re.MULTILINE)
+_DESCRIPTION = """<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0" xmlns:av="urn:schemas-sony-com:av">
+<device>
+<deviceType>urn:schemas-upnp-org:device:MediaRenderer:1</deviceType>
+<friendlyName>BRAVIA %(model)s</friendlyName>
+<manufacturer>Sony Corporation</manufacturer>
+<modelName>%(model)s</modelName>
+<av:X_ScalarWebAPI_DeviceInfo>
+<av:X_ScalarWebAPI_Version>1.0</av:X_ScalarWebAPI_Version>
+<av:X_ScalarWebAPI_BaseURL>http://%(host)s/sony</av:X_ScalarWebAPI_BaseURL>
+<av:X_ScalarWebAPI_ServiceList>
+%(services)s
+</av:X_ScalarWebAPI_ServiceList>
+</av:X_ScalarWebAPI_DeviceInfo>
+</device>
+</root>
+"""
+
+
+def _ircc_code(name):
+    """Return a stable made up IRCC code for a command name."""
+    return "AAAAA%03dAw==" % (sum(name.encode()) % 1000)
+
+
+class MockBraviaServer(object):
+    """HTTP server behaving like a Sony Bravia TV."""
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        psk=PSK,
+        power="active",
+        channels=None,
+        inputs=INPUTS,
+        latency=0.0,
+        error_rate=0.0,
+        errors=None,
+        serial=None,
+        mac=None,
+        notifications=True,
+        wol_port=None,
+        wake_delay=0.0,
+        ssdp_port=None,
+    ):
+        """Initialize the server, it does not listen until started.
+
+        Parameters
+        ---------
+        power: str
+            Initial power status: active, standby or off.
+        channels: dict
+            Number of channels per tuner source, e.g. {"tv:dvbc": 1000}.
+        latency: float or callable
+            Seconds to wait before answering, or a function returning them.
+        error_rate: float
+            Fraction of JSON-RPC requests answered with an internal error.
+        errors: dict
+            JSON-RPC method to the [code, message] error it always returns.
+        notifications: bool
+            Accept websockets for notifications, False behaves like an older
+            model without them.
+        wol_port: int
+            UDP port to receive wake-on-LAN packets on, 0 for any free port.
+            The TV turns active wake_delay seconds after a packet for its MAC.
+        ssdp_port: int
+            UDP port to answer SSDP M-SEARCH on, 0 for any free port.
+        """
+        self.psk = psk
+        self.power = power
+        self.volume = 20
+        self.muted = False
+        self.latency = latency
+        self.error_rate = error_rate
+        self.errors = dict(errors or {})
+        self.notifications = notifications
+        self.wake_delay = wake_delay
+        self.wake_packets = 0
+        self.playing = None
+        self.active_app = None
+        self.requests = collections.Counter()
+        self.connections = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._address = (host, port)
+        self._serial = serial or "%07d" % random.randrange(10**7)
+        self._mac = mac or "fc:f1:52:%02x:%02x:%02x" % tuple(
+            random.randrange(256) for _ in range(3)
+        )
+        self._commands = collections.OrderedDict(
+            (name, _ircc_code(name)) for name in COMMANDS
+        )
+        self._codes = {code: name for name, code in self._commands.items()}
+        self._contents = {}
+        for source, count in (channels if channels is not None else CHANNELS).items():
+            self._contents[source] = [
+                {
+                    "uri": "%s?trip=1.%d.%d&srvName=Channel%%20%d"
+                    % (source, 1000 + index, index, index + 1),
+                    "title": "%s Channel %d"
+                    % (source.split(":")[1].upper(), index + 1),
+                    "index": index,
+                    "dispNum": "%04d" % (index + 1),
+                    "programMediaType": "tv",
+                }
+                for index in range(count)
+            ]
+        self._inputs = [
+            {
+                "uri": "extInput:hdmi?port=%d" % port_number,
+                "title": "HDMI %d" % port_number,
+                "index": port_number - 1,
+            }
+            for port_number in range(1, inputs + 1)
+        ]
+        self._subscribers = []  # (websocket, enabled notification names)
+        self._wol_port = wol_port
+        self._wol_socket = None
+        self._ssdp_port = ssdp_port
+        self._ssdp_socket = None
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        """Start the server when entering the runtime context."""
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop the server when leaving the runtime context."""
+        self.stop()
+
+    @property
+    def host(self):
+        """Return the host:port to give to `BraviaRC`."""
+        return "%s:%d" % self._server.server_address[:2]
+
+    @property
+    def serial(self):
+        """Return the serial number reported by getSystemInformation."""
+        return self._serial
+
+    @property
+    def mac(self):
+        """Return the MAC address reported by the TV."""
+        return self._mac
+
+    @property
+    def wol_port(self):
+        """Return the UDP port receiving wake-on-LAN packets, None if disabled."""
+        if self._wol_socket is None:
+            return None
+        return self._wol_socket.getsockname()[1]
+
+    @property
+    def ssdp_address(self):
+        """Return the (address, port) answering M-SEARCH, None if disabled."""
+        if self._ssdp_socket is None:
+            return None
+        return self._ssdp_socket.getsockname()
+
+    def start(self):
+        """Listen and serve requests in a background thread."""
+        handler = type("Handler", (_Handler,), {"mock": self})
+        self._server = ThreadingHTTPServer(self._address, handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mockbravia", daemon=True
+        )
+        self._thread.start()
+        if self._wol_port is not None:
+            self._wol_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._wol_socket.bind((self._address[0], self._wol_port))
+            threading.Thread(
+                target=self._receive_wol,
+                args=(self._wol_socket,),
+                name="mockbraviawol",
+                daemon=True,
+            ).start()
+        if self._ssdp_port is not None:
+            self._ssdp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._ssdp_socket.bind((self._address[0], self._ssdp_port))
+            threading.Thread(
+                target=self._answer_ssdp,
+                args=(self._ssdp_socket,),
+                name="mockbraviassdp",
+                daemon=True,
+            ).start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for websocket, _ in subscribers:
+            websocket.close()
+        if self._wol_socket is not None:
+            self._wol_socket.close()
+            self._wol_socket = None
+        if self._ssdp_socket is not None:
+            self._ssdp_socket.close()
+            self._ssdp_socket = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def _receive_wol(self, sock):
+        magic = b"\xff" * 6 + bytes.fromhex(self._mac.replace(":", "")) * 16
+        while True:
+            try:
+                packet = sock.recv(1024)
+            except OSError:
+                return
+            if packet != magic:
+                continue
+            with self._lock:
+                self.wake_packets += 1
+                waking = self.power != "active"
+            if waking:
+                threading.Timer(self.wake_delay, self._wake).start()
+
+    def _answer_ssdp(self, sock):
+        while True:
+            try:
+                packet, sender = sock.recvfrom(1024)
+            except OSError:
+                return
+            match = _ST.search(packet)
+            if not packet.startswith(b"M-SEARCH") or match is None:
+                continue
+            target = match.group(1).decode("latin-1")
+            if target not in (SSDP_TARGET, "ssdp:all"):
+                continue
+            with self._lock:
+                self.requests["M-SEARCH"] += 1
+            answer = (
+                "HTTP/1.1 200 OK\r\n"
+                "CACHE-CONTROL: max-age=1800\r\n"
+                "EXT:\r\n"
+                "LOCATION: http://%s/dmr.xml\r\n"
+                "SERVER: Linux/4.9 UPnP/1.0 BRAVIA/1.0\r\n"
+                "ST: %s\r\n"
+                "USN: uuid:%s::%s\r\n\r\n"
+                % (self.host, SSDP_TARGET, self._serial, SSDP_TARGET)
+            )
+            try:
+                sock.sendto(answer.encode("ascii"), sender)
+            except OSError:
+                return
+
+    def description(self):
+        """Return the UPnP device description served at /dmr.xml."""
+        services = "\n".join(
+            "<av:X_ScalarWebAPI_ServiceType>%s</av:X_ScalarWebAPI_ServiceType>"
+            % service
+            for service in SERVICES
+        )
+        return _DESCRIPTION % {"model": MODEL, "host": self.host, "services": services}
+
+    def _wake(self):
+        with self._lock:
+            if self.power == "active":
+                return
+            self.power = "active"
+        self._push("setPowerStatus")
+
+    def _delay(self):
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+
+    def handle_json(self, service, request):
+        """Answer a JSON-RPC request, return the response dict."""
+        method = request.get("method")
+        params = request.get("params") or []
+        param = params[0] if params and isinstance(params[0], dict) else {}
+        with self._lock:
+            self.requests[method] += 1
+        if method in self.errors:
+            return {"error": self.errors[method], "id": request.get("id")}
+        if self.error_rate and random.random() < self.error_rate:
+            return {"error": ERROR_INTERNAL, "id": request.get("id")}
+        handler = getattr(self, "_%s_%s" % (service, method), None)
+        if handler is None:
+            return {"error": ERROR_NO_SUCH_METHOD, "id": request.get("id")}
+        with self._lock:
+            result = handler(param)
+        if isinstance(result, dict) and "error" in result:
+            result["id"] = request.get("id")
+            return result
+        self._push(method)
+        return {"result": result, "id": request.get("id")}
+
+    def handle_ircc(self, body):
+        """Handle an IRCC request, return True if the code is known."""
+        match = _IRCC_CODE.search(body)
+        name = self._codes.get(match.group(1).decode()) if match else None
+        with self._lock:
+            self.requests["IRCC"] += 1
+            if name == "VolumeUp":
+                self.volume = min(self.volume + 1, 100)
+            elif name == "VolumeDown":
+                self.volume = max(self.volume - 1, 0)
+            elif name == "Mute":
+                self.muted = not self.muted
+            elif name == "PowerOff":
+                self.power = "standby"
+            elif name == "TvPower":
+                self.power = "standby" if self.power == "active" else "active"
+        self._push(name)
+        return name is not None
+
+    def notify(self, name, params):
+        """Push a notification to the websockets that enabled it."""
+        message = json.dumps({"method": name, "params": params, "version": "1.0"})
+        with self._lock:
+            subscribers = [
+                websocket for websocket, enabled in self._subscribers if name in enabled
+            ]
+        for websocket in subscribers:
+            try:
+                websocket.send_text(message)
+            except OSError:
+                pass
+
+    def _push(self, method):
+        """Push the notification of a state change caused by method."""
+        name = _PUSHED_BY.get(method)
+        if name is None:
+            return
+        with self._lock:
+            if name == "notifyPowerStatus":
+                params = [{"status": self.power}]
+            elif name == "notifyVolumeInformation":
+                params = [
+                    {"target": "speaker", "volume": self.volume, "mute": self.muted}
+                ]
+            else:
+                params = [dict(self.playing or {})]
+        self.notify(name, params)
+
+    def handle_websocket(self, service, websocket):
+        """Answer JSON-RPC messages of a websocket until it is closed."""
+        enabled = set()
+        with self._lock:
+            self._subscribers.append((websocket, enabled))
+        try:
+            while True:
+                request = json.loads(websocket.receive())
+                if request.get("method") == "switchNotifications":
+                    response = self._switch_notifications(service, request, enabled)
+                else:
+                    response = self.handle_json(service, request)
+                websocket.send_text(json.dumps(response))
+        except (OSError, ValueError, WebSocketError):
+            pass
+        finally:
+            with self._lock:
+                self._subscribers = [
+                    subscriber
+                    for subscriber in self._subscribers
+                    if subscriber[0] is not websocket
+                ]
+            websocket.close()
+
+    def _switch_notifications(self, service, request, enabled):
+        with self._lock:
+            self.requests["switchNotifications"] += 1
+        params = (request.get("params") or [{}])[0]
+        available = NOTIFICATIONS.get(service, ())
+        if "enabled" in params:
+            with self._lock:
+                enabled.clear()
+                enabled.update(
+                    item["name"]
+                    for item in params["enabled"]
+                    if item.get("name") in available
+                )
+        return {
+            "result": [
+                {
+                    "enabled": [
+                        {"name": name, "version": "1.0"}
+                        for name in available
+                        if name in enabled
+                    ],
+                    "disabled": [
+                        {"name": name, "version": "1.0"}
+                        for name in available
+                        if name not in enabled
+                    ],
+                }
+            ],
+            "id": request.get("id"),
+        }
+
+    @property
+    def _active(self):
+        return self.power == "active"
+
+    # sony/system
+
+    def _system_getPowerStatus(self, param):
+        return [{"status": self.power}]
+
+    def _system_setPowerStatus(self, param):
+        self.power = "active" if param.get("status") else "standby"
+        return []
+
+    def _system_getSystemInformation(self, param):
+        return [
+            {
+                "product": "TV",
+                "region": "XEU",
+                "language": "nld",
+                "model": MODEL,
+                "serial": self._serial,
+                "macAddr": self._mac,
+                "mac": self._mac,
+                "name": "BRAVIA",
+                "generation": "5.2.0",
+            }
+        ]
+
+    def _system_getInterfaceInformation(self, param):
+        return [
+            {
+                "productCategory": "tv",
+                "productName": "BRAVIA",
+                "modelName": MODEL,
+                "serverName": "",
+                "interfaceVersion": "5.0.1",
+            }
+        ]
+
+    def _system_getNetworkSettings(self, param):
+        return [
+            [
+                {
+                    "netif": "eth0",
+                    "hwAddr": self._mac,
+                    "ipAddrV4": self._address[0],
+                    "ipAddrV6": "",
+                    "netmask": "255.255.255.0",
+                    "gateway": "192.168.1.1",
+                    "dns": ["192.168.1.1"],
+                }
+            ]
+        ]
+
+    def _system_getRemoteControllerInfo(self, param):
+        if self.power == "off":
+            return {"error": ERROR_NOT_POWER_ON}
+        return [
+            {"bundled": True, "type": "RM-J1100"},
+            [{"name": name, "value": code} for name, code in self._commands.items()],
+        ]
+
+    # sony/audio
+
+    def _audio_getVolumeInformation(self, param):
+        if not self._active:
+            return {"error": ERROR_DISPLAY_OFF}
+        return [
+            [
+                {
+                    "target": "speaker",
+                    "volume": self.volume,
+                    "mute": self.muted,
+                    "maxVolume": 100,
+                    "minVolume": 0,
+                }
+            ]
+        ]
+
+    def _audio_setAudioVolume(self, param):
+        if not self._active:
+            return {"error": ERROR_DISPLAY_OFF}
+        self.volume = min(max(int(param.get("volume", self.volume)), 0), 100)
+        return [0]
+
+    # sony/avContent
+
+    def _avContent_getSourceList(self, param):
+        if param.get("scheme") == "tv":
+            return [[{"source": source} for source in self._contents]]
+        if param.get("scheme") == "extInput":
+            return [[{"source": "extInput:hdmi"}]] if self._inputs else [[]]
+        return {"error": ERROR_ILLEGAL_STATE}
+
+    def _avContent_getContentCount(self, param):
+        source = param.get("source")
+        if source == "extInput:hdmi":
+            return [{"count": len(self._inputs)}]
+        if source not in self._contents:
+            return {"error": ERROR_ILLEGAL_STATE}
+        return [{"count": len(self._contents[source])}]
+
+    def _avContent_getContentList(self, param):
+        source = param.get("source")
+        if source == "extInput:hdmi":
+            return [self._inputs]
+        if source not in self._contents:
+            return {"error": ERROR_ILLEGAL_STATE}
+        start = int(param.get("stIdx", 0))
+        count = min(int(param.get("cnt", PAGE_SIZE)), PAGE_SIZE_MAX)
+        return [self._contents[source][start : start + count]]
+
+    def _avContent_getPlayingContentInfo(self, param):
+        if not self._active or self.playing is None:
+            return {"error": ERROR_ILLEGAL_STATE}
+        return [dict(self.playing)]
+
+    def _avContent_setPlayContent(self, param):
+        uri = param.get("uri")
+        for content in self._inputs + [
+            item for contents in self._contents.values() for item in contents
+        ]:
+            if content["uri"] == uri:
+                self.playing = {
+                    "uri": uri,
+                    "title": content["title"],
+                    "source": uri.split("?")[0],
+                    "dispNum": content.get("dispNum"),
+                    "programMediaType": content.get("programMediaType"),
+                }
+                self.active_app = None
+                return []
+        return {"error": ERROR_ILLEGAL_STATE}
+
+    def _avContent_getCurrentExternalInputsStatus(self, param):
+        if not self._active:
+            return {"error": ERROR_DISPLAY_OFF}
+        return [
+            [
+                dict(
+                    content,
+                    connection=True,
+                    label="",
+                    icon="meta:hdmi",
+                    status="true",
+                )
+                for content in self._inputs
+            ]
+        ]
+
+    # sony/appControl
+
+    def _appControl_getApplicationList(self, param):
+        return [
+            [
+                {
+                    "title": title,
+                    "uri": "com.sony.dtv.%s" % title.lower().replace(" ", ""),
+                    "icon": "http://%s/icons/%s.png"
+                    % (self.host, title.lower().replace(" ", "")),
+                }
+                for title in APPS
+            ]
+        ]
+
+    def _appControl_setActiveApp(self, param):
+        self.active_app = param.get("uri")
+        self.playing = None
+        return []
+
+    # sony/guide
+
+    def _guide_getServiceProtocols(self, param):
+        return [[service, ["1.0"]] for service in SERVICES]
+
+    # sony/accessControl
+
+    def _accessControl_actRegister(self, param):
+        return []
+
+
+def _json_request(body):
+    """Return the JSON-RPC request of a body, an empty dict if it is none."""
+    try:
+        request = json.loads(body)
+    except ValueError:
+        return {}
+    return request if isinstance(request, dict) else {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler bound to a `MockBraviaServer` by subclassing."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    mock = None
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Do not log every request."""
+
+    def setup(self):
+        """Count the accepted connection."""
+        super().setup()
+        with self.mock._lock:
+            self.mock.connections += 1
+
+    def _reply(self, status, body, content_type="application/json", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.mock._lock:
+            self.mock.bytes_out += len(body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Serve app icon placeholders, the device description or a websocket."""
+        self.mock._delay()
+        if self.headers.get("Upgrade", "").lower() == "websocket":
+            self._upgrade()
+        elif self.path.startswith("/icons/"):
+            self._reply(200, b"\x89PNG\r\n\x1a\n" + self.path.encode(), "image/png")
+        elif self.path == "/dmr.xml":
+            self._reply(200, self.mock.description().encode(), "text/xml")
+        else:
+            self._reply(404, b"")
+
+    def _upgrade(self):
+        service = self.path.rsplit("/", 1)[-1]
+        if (
+            not self.mock.notifications
+            or service not in NOTIFICATIONS
+            or self.headers.get("X-Auth-PSK") != self.mock.psk
+        ):
+            self._reply(404, b"")
+            return
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header(
+            "Sec-WebSocket-Accept", accept_key(self.headers["Sec-WebSocket-Key"])
+        )
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        self.mock.handle_websocket(
+            service, WebSocket(self.connection, self.rfile, client=False)
+        )
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Answer a JSON-RPC or IRCC request."""
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.mock._lock:
+            self.mock.bytes_in += len(body)
+        self.mock._delay()
+        service = self.path.rsplit("/", 1)[-1]
+
+        if service == "accessControl":
+            request = json.loads(body)
+            response = self.mock.handle_json(service, request)
+            self._reply(
+                200,
+                json.dumps(response).encode(),
+                headers=[("Set-Cookie", "auth=%s; Path=/sony/" % self.mock.psk)],
+            )
+            return
+
+        if self.headers.get("X-Auth-PSK") != self.mock.psk:
+            request = _json_request(body)
+            if request.get("method") not in PUBLIC_METHODS:
+                self._reply(
+                    403,
+                    json.dumps(
+                        {"error": ERROR_FORBIDDEN, "id": request.get("id", 1)}
+                    ).encode(),
+                )
+                return
+
+        if service == "IRCC":
+            if self.mock.handle_ircc(body):
+                self._reply(200, b"<s:Envelope/>", "text/xml")
+            else:
+                self._reply(500, b"<s:Envelope><s:Fault/></s:Envelope>", "text/xml")
+            return
+
+        try:
+            request = json.loads(body)
+        except ValueError:
+            self._reply(400, b"")
+            return
+        response = self.mock.handle_json(service, request)
+        self._reply(200, json.dumps(response).encode())
+
+
+def main():
+    """Run a mock TV until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--psk", default=PSK)
+    parser.add_argument("--power", default="active")
+    parser.add_argument("--channels", type=int, default=CHANNELS["tv:dvbc"])
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = MockBraviaServer(
+        args.host,
+        args.port,
+        psk=args.psk,
+        power=args.power,
+        channels={"tv:dvbc": args.channels},
+        latency=args.latency,
+        error_rate=args.error_rate,
+    ).start()
+    print("Mock Bravia TV listening on %s with PSK %s" % (server.host, server.psk))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Changes pushed by a Sony Bravia TV instead of polling it.
+
+Newer Bravia firmware pushes notifyPowerStatus, notifyVolumeInformation and
+notifyPlayingContentInfo over a websocket on the /sony/<service> endpoints.
+`BraviaNotifier` enables them and calls its subscribers with the same
+(field, old_value, new_value) as `BraviaPoller`. Fields the TV cannot push, or
+all of them on older models, are polled by a `BraviaPoller` instead.
+"""
+import collections
+import logging
+import threading
+
+from .poller import POLL_INTERVALS, BraviaPoller
+from .sony_bravia_psk import NOTIFICATIONS, json_loads
+from .websocket import WebSocketError
+
+RECONNECT_MIN = 1  # seconds before reconnecting a lost notification channel
+RECONNECT_MAX = 60  # maximum seconds between reconnects, doubled on every failure
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class BraviaNotifier(object):
+    """Report the changes of a `BraviaRC`, pushed where possible, else polled."""
+
+    def __init__(self, braviarc, fields=None, intervals=None):
+        """Initialize the notifier.
+
+        Parameters
+        ---------
+        braviarc: BraviaRC
+            The TV to follow.
+        fields: iterable
+            Fields to report, all fields of POLL_INTERVALS by default.
+        intervals: dict
+            Polling intervals of the polled fields, see `BraviaPoller`.
+        """
+        self._braviarc = braviarc
+        self._fields = [
+            field for field in POLL_INTERVALS if fields is None or field in fields
+        ]
+        self._intervals = intervals
+        self._values = {}
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._websockets = {}
+        self._threads = []
+        self._poller = None
+        self.pushed = frozenset()
+
+    def __enter__(self):
+        """Start when entering the runtime context."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop when leaving the runtime context."""
+        self.stop()
+
+    @property
+    def values(self):
+        """Return the last known value of every field."""
+        return dict(self._values)
+
+    @property
+    def subscribed(self):
+        """Return True while the notifier has subscribers."""
+        return bool(self._subscribers)
+
+    @property
+    def polled(self):
+        """Return the fields that are polled instead of pushed."""
+        return frozenset(self._fields) - self.pushed
+
+    def subscribe(self, callback, fields=None):
+        """Call callback(field, old_value, new_value) when a field changes.
+
+        fields limits the callback to the given field names. Returns a function
+        that removes the subscription.
+        """
+        subscriber = (callback, frozenset(fields) if fields else None)
+        with self._lock:
+            self._subscribers.append(subscriber)
+
+        def unsubscribe():
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+
+        return unsubscribe
+
+    def start(self):
+        """Open the notification channels and poll what cannot be pushed."""
+        if self._threads or self._poller is not None:
+            return
+        self._stopped.clear()
+        services = collections.OrderedDict()
+        for field in self._fields:
+            if field in NOTIFICATIONS:
+                service, name = NOTIFICATIONS[field]
+                services.setdefault(service, []).append(name)
+        pushed = set()
+        for service, names in services.items():
+            try:
+                websocket, enabled = self._braviarc.open_notifications(service, names)
+            except (OSError, ValueError, WebSocketError) as exception_instance:
+                _LOGGER.debug(
+                    "No notifications from %s/%s, polling: %s",
+                    self._braviarc.host,
+                    service,
+                    exception_instance,
+                )
+                continue
+            if not enabled:
+                websocket.close()
+                continue
+            pushed.update(
+                field for field, (_, name) in NOTIFICATIONS.items() if name in enabled
+            )
+            self._websockets[service] = websocket
+            thread = threading.Thread(
+                target=self._listen,
+                args=(service, enabled, websocket),
+                name="bravianotifier",
+                daemon=True,
+            )
+            self._threads.append(thread)
+        self.pushed = frozenset(pushed)
+        self._refresh(self.pushed)
+        for thread in self._threads:
+            thread.start()
+        if self.polled:
+            self._poller = BraviaPoller(self._braviarc, self._intervals, self.polled)
+            self._poller.subscribe(self._update_polled)
+            self._poller.start()
+
+    def stop(self):
+        """Close the notification channels and stop polling."""
+        self._stopped.set()
+        with self._lock:
+            websockets, self._websockets = self._websockets, {}
+        for websocket in websockets.values():
+            websocket.close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._poller is not None:
+            self._poller.stop()
+            self._poller = None
+
+    def _refresh(self, fields):
+        """Request the current value of fields, e.g. after missing notifications."""
+        for field in fields:
+            try:
+                value = getattr(self._braviarc, POLL_INTERVALS[field][0])()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Refreshing %s failed", field)
+                continue
+            self._update(field, value)
+
+    def _listen(self, service, names, websocket):
+        backoff = RECONNECT_MIN
+        while not self._stopped.is_set():
+            try:
+                while True:
+                    self._dispatch(json_loads(websocket.receive()))
+                    backoff = RECONNECT_MIN
+            except (OSError, ValueError, WebSocketError) as exception_instance:
+                if self._stopped.is_set():
+                    return
+                _LOGGER.debug(
+                    "Notifications of %s/%s lost: %s",
+                    self._braviarc.host,
+                    service,
+                    exception_instance,
+                )
+            while not self._stopped.wait(backoff):
+                backoff = min(backoff * 2, RECONNECT_MAX)
+                try:
+                    websocket, _ = self._braviarc.open_notifications(service, names)
+                except (OSError, ValueError, WebSocketError):
+                    continue
+                with self._lock:
+                    if self._stopped.is_set():
+                        websocket.close()
+                        return
+                    self._websockets[service] = websocket
+                self._refresh(
+                    field for field, (_, name) in NOTIFICATIONS.items() if name in names
+                )
+                break
+
+    def _dispatch(self, message):
+        notification = self._braviarc.parse_notification(message)
+        if notification is None:
+            return
+        field, value = notification
+        if field == "volume":
+            if value is None:
+                return
+            # Notifications leave out e.g. minVolume and maxVolume.
+            value = dict(self._values.get("volume") or {}, **value)
+        self._update(field, value)
+
+    def _update_polled(self, field, old_value, new_value):
+        self._update(field, new_value)
+
+    def _update(self, field, value):
+        with self._lock:
+            changed = field not in self._values or self._values[field] != value
+            old_value = self._values.get(field)
+            self._values[field] = value
+            subscribers = list(self._subscribers) if changed else []
+        if changed and field == "power" and self._poller is not None:
+            # Like the poller itself, look at the other fields soon.
+            self._poller.nudge()
+        for callback, fields in subscribers:
+            if fields is not None and field not in fields:
+                continue
+            try:
+                callback(field, old_value, value)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error in subscriber of %s", field)
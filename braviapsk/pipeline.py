@@ -0,0 +1,190 @@
+"""Queued commands for a Sony Bravia TV.
+
+A `CommandPipeline` collects commands and sends them in one go. Runs of volume
+key presses become a single setAudioVolume request when the current volume is
+known, a source selection followed by another one is dropped, and the
+remaining key presses are sent back-to-back over the warm connection.
+"""
+import collections
+import threading
+import time
+
+KEY_SPACING = 0.0  # seconds to wait between two key presses
+VOLUME_STEPS = {"VolumeUp": 1, "VolumeDown": -1}
+
+MacroResult = collections.namedtuple(
+    "MacroResult", ["commands", "requests", "dropped", "latency"]
+)
+MacroResult.__doc__ = """Outcome of a flushed pipeline.
+
+commands is the number of queued commands, requests the number of requests
+the flush sent to the TV, reads answered by the read cache not included, dropped the number of superseded commands and latency the
+seconds from queueing the first command until the last request finished.
+"""
+
+_KEY = "key"
+_VOLUME = "volume"
+_SOURCE = "source"
+_CONTENT = "content"
+
+
+class CommandPipeline(object):
+    """Commands queued for one `BraviaRC`, sent on flush."""
+
+    def __init__(self, braviarc, key_spacing=KEY_SPACING):
+        """Initialize an empty pipeline."""
+        self._braviarc = braviarc
+        self._key_spacing = key_spacing
+        self._queue = []
+        self._queued_at = None
+        self._lock = threading.Lock()
+        self.last_result = None
+
+    def __enter__(self):
+        """Enter the runtime context."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Send the queued commands when leaving the runtime context."""
+        if exc_type is None:
+            self.flush()
+
+    def __len__(self):
+        """Return the number of queued commands."""
+        return len(self._queue)
+
+    def _put(self, kind, value, repeat=1):
+        with self._lock:
+            if self._queued_at is None:
+                self._queued_at = time.monotonic()
+            self._queue.extend([(kind, value)] * repeat)
+        return self
+
+    def send_command(self, command, repeat=1):
+        """Queue a remote controller key press."""
+        if command in VOLUME_STEPS:
+            return self._put(_VOLUME, VOLUME_STEPS[command], repeat)
+        return self._put(_KEY, command, repeat)
+
+    def volume_up(self, repeat=1):
+        """Queue volume up key presses."""
+        return self._put(_VOLUME, 1, repeat)
+
+    def volume_down(self, repeat=1):
+        """Queue volume down key presses."""
+        return self._put(_VOLUME, -1, repeat)
+
+    def select_source(self, source):
+        """Queue selecting an input source by title."""
+        return self._put(_SOURCE, source)
+
+    def play_content(self, uri):
+        """Queue playing content by URI."""
+        return self._put(_CONTENT, uri)
+
+    @staticmethod
+    def _coalesce(queue):
+        """Merge volume steps and drop superseded source selections.
+
+        Returns the steps to run and the number of dropped commands.
+        """
+        selected = []
+        dropped = 0
+        for kind, value in queue:
+            if kind in (_SOURCE, _CONTENT):
+                # Volume does not depend on the source, look past it.
+                index = len(selected) - 1
+                while index >= 0 and selected[index][0] == _VOLUME:
+                    index -= 1
+                if index >= 0 and selected[index][0] in (_SOURCE, _CONTENT):
+                    del selected[index]
+                    dropped += 1
+            selected.append((kind, value))
+        # Volume runs only become adjacent once the sources between are dropped.
+        steps = []
+        for kind, value in selected:
+            if kind == _VOLUME and steps and steps[-1][0] == _VOLUME:
+                steps[-1] = (_VOLUME, steps[-1][1] + value)
+            else:
+                steps.append((kind, value))
+        return [step for step in steps if step != (_VOLUME, 0)], dropped
+
+    def flush(self):
+        """Send the queued commands and return a `MacroResult`.
+
+        The result is also kept in last_result, e.g. when the pipeline was
+        flushed by leaving its runtime context.
+        """
+        with self._lock:
+            queue, self._queue = self._queue, []
+            queued_at, self._queued_at = self._queued_at, None
+        if not queue:
+            self.last_result = MacroResult(0, 0, 0, 0.0)
+            return self.last_result
+        steps, dropped = self._coalesce(queue)
+        keys = {value for kind, value in steps if kind == _KEY}
+        if any(kind == _VOLUME for kind, _ in steps):
+            keys.update(VOLUME_STEPS)
+        # Count the requests sent from this thread, reads answered by the read
+        # cache or by another thread's request in flight are not sent.
+        thread = threading.get_ident()
+        sent = []
+
+        def count(event):
+            if threading.get_ident() == thread:
+                sent.append(event)
+
+        remove_observer = self._braviarc.add_observer(count)
+        try:
+            self._run(steps, keys)
+        finally:
+            remove_observer()
+        self.last_result = MacroResult(
+            len(queue), len(sent), dropped, time.monotonic() - queued_at
+        )
+        return self.last_result
+
+    def _run(self, steps, keys):
+        """Send the coalesced steps."""
+        if keys:
+            self._braviarc.prepare_commands(keys)
+        volume = None
+        last_was_key = False
+        for kind, value in steps:
+            if kind == _VOLUME:
+                volume, last_was_key = self._change_volume(value, volume, last_was_key)
+            elif kind == _KEY:
+                self._space_key(last_was_key)
+                self._braviarc.send_command(value)
+                last_was_key = True
+            else:
+                if kind == _SOURCE:
+                    self._braviarc.select_source(value)
+                else:
+                    self._braviarc.play_content(value)
+                last_was_key = False
+
+    def _space_key(self, last_was_key):
+        if last_was_key and self._key_spacing:
+            time.sleep(self._key_spacing)
+
+    def _change_volume(self, delta, volume, last_was_key):
+        """Apply a volume change, return the new volume and last_was_key."""
+        if volume is None:
+            volume_info = self._braviarc.get_volume_info()
+            if volume_info is not None and "volume" in volume_info:
+                volume = volume_info
+        if volume is None:
+            # Volume unknown (e.g. display off), press the keys instead.
+            command = "VolumeUp" if delta > 0 else "VolumeDown"
+            for _ in range(abs(delta)):
+                self._space_key(last_was_key)
+                self._braviarc.send_command(command)
+                last_was_key = True
+            return None, last_was_key
+        level = min(
+            max(volume["volume"] + delta, volume.get("minVolume", 0)),
+            volume.get("maxVolume", 100),
+        )
+        self._braviarc.set_volume_level(level / 100)
+        return dict(volume, volume=level), False
@@ -0,0 +1,186 @@
+"""Background polling of a Sony Bravia TV with change notifications.
+
+`BraviaPoller` polls every endpoint of one TV at its own pace: fast right
+after a command or a detected change, slower and slower while nothing
+changes. Subscribers are only called for the fields that changed, so any
+number of listeners can share one poller.
+"""
+import logging
+import threading
+import time
+
+from .sony_bravia_psk import POWER_DEPENDENT_FIELDS
+
+# field: (BraviaRC method, fastest interval, slowest interval) in seconds
+POLL_INTERVALS = {
+    "power": ("get_power_status", 1, 30),
+    "volume": ("get_volume_info", 1, 30),
+    "playing": ("get_playing_info", 2, 60),
+    "external_inputs": ("get_current_external_input_status", 5, 120),
+}
+BACKOFF_FACTOR = 1.5  # interval growth after each poll without change
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _Endpoint(object):
+    """Polling state of one field."""
+
+    __slots__ = ("method", "fastest", "slowest", "interval", "due")
+
+    def __init__(self, method, fastest, slowest):
+        self.method = method
+        self.fastest = fastest
+        self.slowest = slowest
+        self.interval = fastest
+        self.due = 0
+
+    def speed_up(self, now):
+        self.interval = self.fastest
+        self.due = now
+
+    def schedule(self, now, changed):
+        if changed:
+            self.interval = self.fastest
+        else:
+            self.interval = min(self.interval * BACKOFF_FACTOR, self.slowest)
+        self.due = now + self.interval
+
+
+class BraviaPoller(object):
+    """Poll a `BraviaRC` in a background thread and report changes."""
+
+    def __init__(self, braviarc, intervals=None, fields=None):
+        """Initialize the poller.
+
+        Parameters
+        ---------
+        braviarc: BraviaRC
+            The TV to poll.
+        intervals: dict
+            Overrides of POLL_INTERVALS, field to (fastest, slowest) seconds.
+        fields: iterable
+            Fields to poll, all fields of POLL_INTERVALS by default.
+        """
+        self._braviarc = braviarc
+        self._endpoints = {}
+        for field, (method, fastest, slowest) in POLL_INTERVALS.items():
+            if fields is not None and field not in fields:
+                continue
+            fastest, slowest = (intervals or {}).get(field, (fastest, slowest))
+            self._endpoints[field] = _Endpoint(method, fastest, slowest)
+        self._values = {}
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._remove_listener = None
+
+    def __enter__(self):
+        """Start polling when entering the runtime context."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop polling when leaving the runtime context."""
+        self.stop()
+
+    @property
+    def values(self):
+        """Return the last polled value of every field."""
+        return dict(self._values)
+
+    def subscribe(self, callback, fields=None):
+        """Call callback(field, old_value, new_value) when a field changes.
+
+        fields limits the callback to the given field names. Returns a function
+        that removes the subscription.
+        """
+        subscriber = (callback, frozenset(fields) if fields else None)
+        with self._lock:
+            self._subscribers.append(subscriber)
+
+        def unsubscribe():
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+
+        return unsubscribe
+
+    def nudge(self):
+        """Poll all fields now and fast for a while, e.g. after a command."""
+        now = time.monotonic()
+        for endpoint in self._endpoints.values():
+            endpoint.speed_up(now)
+        self._wakeup.set()
+
+    def start(self):
+        """Start the polling thread."""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._remove_listener = self._braviarc.add_command_listener(
+            lambda command: self.nudge()
+        )
+        self._thread = threading.Thread(
+            target=self._run, name="braviapoller", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the polling thread and wait for it to finish."""
+        if self._thread is None:
+            return
+        self._remove_listener()
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            for field, endpoint in self._endpoints.items():
+                if endpoint.due <= now and not self._stopped.is_set():
+                    self._poll(field, endpoint)
+            next_due = min(
+                (endpoint.due for endpoint in self._endpoints.values()),
+                default=now + POLL_INTERVALS["power"][2],
+            )
+            self._wakeup.wait(max(0, next_due - time.monotonic()))
+            self._wakeup.clear()
+
+    def _poll(self, field, endpoint):
+        if (
+            field in POWER_DEPENDENT_FIELDS
+            and self._values.get("power", "active") != "active"
+        ):
+            # Nothing to ask while the TV is off, a power change speeds it up.
+            endpoint.schedule(time.monotonic(), False)
+            return
+        try:
+            value = getattr(self._braviarc, endpoint.method)()
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Polling %s failed", field)
+            endpoint.schedule(time.monotonic(), False)
+            return
+        changed = field not in self._values or self._values[field] != value
+        old_value = self._values.get(field)
+        self._values[field] = value
+        if changed and field == "power":
+            self.nudge()
+        endpoint.schedule(time.monotonic(), changed)
+        if changed:
+            self._notify(field, old_value, value)
+
+    def _notify(self, field, old_value, new_value):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback, fields in subscribers:
+            if fields is not None and field not in fields:
+                continue
+            try:
+                callback(field, old_value, new_value)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error in subscriber of %s", field)
@@ -0,0 +1,140 @@
+"""Short-lived cache of read requests to a Sony Bravia TV.
+
+Callers asking a TV for the same thing at the same time share one request:
+the first caller sends it, the others wait for its result. Results of the
+methods in READ_CACHE_TTL are then kept for a few moments, so components
+polling the same TV do not each send their own request. Commands changing the
+TV drop the entries they affect. Failed requests and error responses are never
+kept.
+"""
+import threading
+import time
+
+# JSON-RPC method: seconds a result is reused, 0 to only merge concurrent calls
+READ_CACHE_TTL = {
+    "getPowerStatus": 0.5,
+    "getVolumeInformation": 0.5,
+    "getSystemInformation": 3600,
+    "getNetworkSettings": 60,
+}
+# command reported to the command listeners: methods whose results it changes
+READ_INVALIDATIONS = {
+    "setAudioVolume": ("getVolumeInformation",),
+    "setActiveApp": ("getPowerStatus",),
+    "setPlayContent": ("getPowerStatus",),
+}
+# methods changed by all other commands, e.g. IRCC key presses
+DEFAULT_INVALIDATIONS = ("getPowerStatus", "getVolumeInformation")
+
+
+class _Flight(object):
+    """A request in progress and the callers waiting for it."""
+
+    __slots__ = ("done", "value")
+
+    def __init__(self, done):
+        self.done = done
+        self.value = None
+
+
+class _ReadCacheBase(object):
+    """Cached values and requests in flight, keyed by (method, request)."""
+
+    def __init__(self, ttl=None):
+        """Initialize an empty cache, ttl overrides READ_CACHE_TTL."""
+        self._ttl = dict(READ_CACHE_TTL)
+        self._ttl.update(ttl or {})
+        self._values = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key, new_done):
+        """Return (value, None, False) when key is cached, else (None, flight, leader).
+
+        leader is True when the caller has to send the request of the flight.
+        """
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    return entry[1], None, False
+                del self._values[key]
+            flight = self._flights.get(key)
+            if flight is not None:
+                return None, flight, False
+            flight = self._flights[key] = _Flight(new_done())
+            return None, flight, True
+
+    def _land(self, key, flight, value):
+        """Store the result of the leading request, unless invalidated meanwhile."""
+        flight.value = value
+        with self._lock:
+            if self._flights.get(key) is not flight:
+                return
+            del self._flights[key]
+            ttl = self._ttl.get(key[0], 0)
+            if ttl > 0 and value is not None and "error" not in value:
+                self._values[key] = (time.monotonic() + ttl, value)
+
+    def invalidate(self, methods=None):
+        """Drop the cached results of methods, all if None.
+
+        Requests in flight keep running for their callers, but later callers
+        do not join them and their result is not stored.
+        """
+        with self._lock:
+            for entries in (self._values, self._flights):
+                for key in list(entries):
+                    if methods is None or key[0] in methods:
+                        del entries[key]
+
+    def invalidate_command(self, command):
+        """Drop the results changed by a command sent to the TV."""
+        self.invalidate(READ_INVALIDATIONS.get(command, DEFAULT_INVALIDATIONS))
+
+
+class ReadCache(_ReadCacheBase):
+    """Thread-safe read cache of `BraviaRC`."""
+
+    def get(self, key, fetch):
+        """Return the cached value of key or the result of fetch().
+
+        key is a (method, request) tuple. Concurrent calls with the same key
+        share a single call of fetch.
+        """
+        value, flight, leader = self._join(key, threading.Event)
+        if flight is None:
+            return value
+        if not leader:
+            flight.done.wait()
+            return flight.value
+        value = None
+        try:
+            value = fetch()
+        finally:
+            self._land(key, flight, value)
+            flight.done.set()
+        return value
+
+
+class AsyncReadCache(_ReadCacheBase):
+    """Read cache of `AsyncBraviaRC`, used from a single event loop."""
+
+    async def get(self, key, fetch):
+        """Return the cached value of key or the result of await fetch()."""
+        # Imported here, asyncio is slow to import and only used by this class.
+        import asyncio
+
+        value, flight, leader = self._join(key, asyncio.Event)
+        if flight is None:
+            return value
+        if not leader:
+            await flight.done.wait()
+            return flight.value
+        value = None
+        try:
+            value = await fetch()
+        finally:
+            self._land(key, flight, value)
+            flight.done.set()
+        return value
@@ -0,0 +1,233 @@
+"""Record the traffic of Sony Bravia TVs and replay it without them.
+
+`TrafficRecorder` appends every request a `BraviaRC` sends, with the response,
+timestamp and latency, as one compact JSON line to a log file. The transport
+of `replay_transport` answers the requests of a `BraviaRC` from such a log at
+the recorded latencies or faster, to profile the client against the behaviour
+of real firmware away from the TV:
+
+    with TrafficRecorder("bravia.log") as recorder:
+        braviarc = BraviaRC(host, psk, recorder=recorder)
+    ...
+    braviarc = BraviaRC(host, psk, transport=replay_transport("bravia.log", 10))
+
+Every line holds t (start time), l (latency in seconds), h (host), p (path),
+q (request body) and either s (status), b (response body), c (cookies) and r
+(connection reused) or e (name of the transport exception). The PSK header is
+not recorded, bodies are stored as latin-1 strings.
+"""
+import collections
+import logging
+import re
+import threading
+import time
+
+from .sony_bravia_psk import json_dumps, json_loads
+from .transport import (
+    ConnectTimeout,
+    Response,
+    StaleConnection,
+    Timeout,
+    TransportError,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+_ID = re.compile(rb'"id":\s*(\d+)')
+_ERRORS = {
+    "ConnectTimeout": ConnectTimeout,
+    "StaleConnection": StaleConnection,
+    "Timeout": Timeout,
+    "TransportError": TransportError,
+}
+
+
+def _find_id(data):
+    """Return the match of the JSON-RPC id of a body, None if it has none."""
+    start = data.rfind(b'"id"')
+    return _ID.match(data, start) if start >= 0 else None
+
+
+def _request_key(path, data):
+    """Return the key matching a request to the recorded ones, ignoring its id."""
+    match = _find_id(data)
+    if match is not None:
+        data = data[: match.start(1)] + data[match.end(1) :]
+    return path, data
+
+
+def _answer_id(content, data):
+    """Return the response body with the id of the request in data."""
+    request = _find_id(data)
+    match = _find_id(content) if request is not None else None
+    if match is None:
+        return content
+    return content[: match.start(1)] + request.group(1) + content[match.end(1) :]
+
+
+def read_log(path):
+    """Yield the entries of a traffic log, skipping lines that cannot be read.
+
+    The last line of a log is cut off when the process was killed while writing.
+    """
+    with open(path, "rb") as log:
+        for number, line in enumerate(log, 1):
+            try:
+                yield json_loads(line)
+            except ValueError:
+                _LOGGER.warning("Skipping line %d of %s", number, path)
+
+
+class TrafficRecorder(object):
+    """Append the requests of any number of `BraviaRC` to one log file."""
+
+    def __init__(self, path):
+        """Initialize the recorder, the log file is opened on the first request."""
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        """Enter the runtime context."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the log file when leaving the runtime context."""
+        self.close()
+
+    def transport(self, transport, host):
+        """Return transport recording the requests to host, used by `BraviaRC`."""
+        return RecordingTransport(transport, self, host)
+
+    def record(self, entry):
+        """Append an entry to the log and flush it, see the module for the keys."""
+        line = json_dumps(entry) + b"\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "ab")
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        """Close the log file, it is opened again by the next request."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class RecordingTransport(object):
+    """Transport recording the requests it sends through another transport."""
+
+    def __init__(self, transport, recorder, host):
+        """Initialize the transport, see `TrafficRecorder.transport`."""
+        self._transport = transport
+        self._recorder = recorder
+        self._host = host
+
+    def post(self, path, data, headers):
+        """Post data to /path with the wrapped transport and record it."""
+        entry = {
+            "t": round(time.time(), 3),
+            "l": 0,
+            "h": self._host,
+            "p": path,
+            "q": data.decode("latin-1"),
+        }
+        started = time.perf_counter()
+        try:
+            response = self._transport.post(path, data, headers)
+        except TransportError as exception_instance:
+            entry["l"] = round(time.perf_counter() - started, 6)
+            entry["e"] = type(exception_instance).__name__
+            self._recorder.record(entry)
+            raise
+        entry["l"] = round(time.perf_counter() - started, 6)
+        entry["s"] = response.status
+        entry["b"] = response.content.decode("latin-1")
+        cookies = response.cookies
+        if cookies:
+            entry["c"] = cookies
+        entry["r"] = response.reused
+        self._recorder.record(entry)
+        return response
+
+    def close(self):
+        """Close the wrapped transport."""
+        self._transport.close()
+
+
+class ReplayTransport(object):
+    """Answer requests with the recorded responses to the same requests.
+
+    Requests are matched by path and body, ignoring the JSON-RPC id. Identical
+    requests get the recorded responses in turn, starting over after the last,
+    so intermittent errors come back in the recorded order. The id of a
+    response is replaced by the id of the request.
+    """
+
+    def __init__(self, entries, speed=1.0):
+        """Initialize the transport.
+
+        Parameters
+        ---------
+        entries: iterable
+            Entries of a traffic log, see `read_log`.
+        speed: float
+            Replay speed, 1 waits the recorded latency before answering, 10
+            a tenth of it and 0 or None does not wait.
+        """
+        self._responses = collections.defaultdict(list)
+        for entry in entries:
+            key = _request_key(entry["p"], entry["q"].encode("latin-1"))
+            self._responses[key].append(entry)
+        self._served = collections.Counter()
+        self._speed = speed
+        self._lock = threading.Lock()
+
+    def post(self, path, data, headers):
+        """Return the recorded `Response` to data, or raise the recorded error."""
+        key = _request_key(path, data)
+        with self._lock:
+            entries = self._responses.get(key)
+            if entries:
+                entry = entries[self._served[key] % len(entries)]
+                self._served[key] += 1
+        if not entries:
+            raise TransportError(
+                "No recorded response to %s %s" % (path, data[:200].decode("latin-1"))
+            )
+        if self._speed:
+            time.sleep(entry["l"] / self._speed)
+        if "e" in entry:
+            raise _ERRORS.get(entry["e"], TransportError)(
+                "Recorded %s of %s" % (entry["e"], path)
+            )
+        response = Response(
+            entry["s"],
+            {},
+            _answer_id(entry["b"].encode("latin-1"), data),
+            ["%s=%s" % item for item in entry.get("c", {}).items()],
+        )
+        response.reused = entry.get("r")
+        return response
+
+    def close(self):
+        """Do nothing, there are no connections to close."""
+
+
+def replay_transport(path, speed=1.0):
+    """Return a transport factory replaying the log at path.
+
+    The log is read once. Every `BraviaRC` using the factory is answered with
+    the entries recorded for its host, or with all entries when the log has
+    none for it, e.g. when replaying against a mock address. See
+    `ReplayTransport` for speed.
+    """
+    entries = list(read_log(path))
+
+    def factory(host, pool_size, connect_timeout, read_timeout):
+        own = [entry for entry in entries if entry.get("h") == host]
+        return ReplayTransport(own or entries, speed)
+
+    return factory
@@ -7,64 +7,312 @@ Updated by Gerard for use in Home Assistant.
     Changes:
     * Use Pre-shared key (PSK) instead of connecting with a pin and the use of a cookie.
     * Added function to calculate the media position.
+    * Reuse a pooled keep-alive HTTP session per TV instead of a new connection
+      for every request.
+    * Optionally keep the command codes and content list in a persistent cache.
+    * Fail fast on TVs that are known to be unreachable.
+    * Report the latency, size and outcome of every request to observers.
+    * Build static request bodies once and decode responses straight from bytes,
+      with orjson when it is installed.
+    * Thread-safe, concurrent identical reads share one request and power, volume
+      and system information are reused for a short while.
+    * Keep the channels in an indexed `ChannelDirectory`, select_source also
+      matches titles ignoring case, display numbers and URIs. A title shared
+      by several channels stands for the first one, also in load_source_list.
+    * Subscribe to changes pushed by the TV over websockets, polling TVs that do
+      not support notifications.
+    * Send wake-on-LAN packets in bursts from a shared socket, optionally wait
+      until the TV is on.
+    * Give every JSON-RPC request a unique id and send batches of calls, one
+      service per connection, all services in parallel.
+    * Send requests over persistent http.client connections by default, requests
+      is only imported when it is chosen as transport.
+    * Keep the apps in an `AppCatalog` refreshed in the background, open apps by
+      name and fetch their icons concurrently into an LRU.
+    * Discover TVs with SSDP and a concurrent scan of the network.
+    * Optionally record all requests and responses to a log that a replay
+      transport serves back without the TV.
 """
 import base64
 import collections
 import datetime
+import itertools
 import json
 import logging
-import socket
-import struct
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import requests
+try:
+    import orjson
+except ImportError:  # optional, only makes JSON encoding and decoding faster
+    orjson = None
+
+from .apps import APP_CATALOG_TTL, App, AppCatalog, IconCache, fetch_icon
+from .channels import ChannelDirectory
+from .health import CONNECT_TIMEOUT, CircuitBreaker, TVUnavailableError, probe
+from .metrics import RequestEvent
+from .pipeline import KEY_SPACING, CommandPipeline
+from .readcache import ReadCache
+from .transport import (
+    DEFAULT_TRANSPORT,
+    HTTPError,
+    Timeout,
+    TransportError,
+    transport_factory,
+)
+from .websocket import WebSocket
+from .wol import default_waker
 
 TIMEOUT = 8  # timeout in seconds
+POOL_SIZE = 4  # number of keep-alive connections kept open per TV
+# wait time in seconds before retrying getRemoteControllerInfo after a failure,
+# doubled on every failure (e.g. while the TV is not powered on)
+COMMANDS_BACKOFF_MIN = 2
+COMMANDS_BACKOFF_MAX = 60
+WAKE_TIMEOUT = 30  # seconds turn_on(wait=True) waits for the TV to be active
+WAKE_POLL_INTERVAL = 0.5  # seconds between two power checks while waiting
+AUTH_ERRORS = (401, 403)  # JSON-RPC error codes of a TV refusing the PSK
+# commands of which the IRCC request is built once by prepare_commands
+COMMON_COMMANDS = (
+    "VolumeUp",
+    "VolumeDown",
+    "Mute",
+    "Play",
+    "Pause",
+    "TvPause",
+    "Next",
+    "Prev",
+    "PowerOff",
+    "TvPower",
+)
+
+CONTENT_PAGE_SIZE = 50  # number of contents requested per getContentList call
+
+# tv:dvbc = via cable, tv:dvbt = via DTT, tv:dvbs = via satellite
+# tv:isdbgt = Brazilian Digital TV standard, tv:atsct = via atsct
+# tv:analog = via analog input
+TV_SOURCES = (
+    "tv:dvbc",
+    "tv:dvbt",
+    "tv:dvbs",
+    "tv:isdbt",
+    "tv:isdbbs",
+    "tv:isdbcs",
+    "tv:isdbgt",
+    "tv:atsct",
+    "tv:analog",
+)
+# physical inputs
+EXT_INPUT_SOURCES = (
+    "extInput:hdmi",
+    "extInput:composite",
+    "extInput:component",
+    "extInput:cec",
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+BraviaState = collections.namedtuple(
+    "BraviaState", ["power", "volume", "playing", "external_inputs", "stale", "time"]
+)
+BraviaState.__doc__ = """Snapshot of a TV returned by get_state.
 
-class BraviaRC(object):
-    """Representation of a Sony Bravia TV."""
+stale holds the names of the fields that were not refreshed because the TV is
+not active, they keep the value of the previous snapshot.
+"""
+# fields of BraviaState that are only requested from an active TV
+POWER_DEPENDENT_FIELDS = ("volume", "playing", "external_inputs")
+# fields of BraviaState the TV can push: (service, notification)
+NOTIFICATIONS = {
+    "power": ("system", "notifyPowerStatus"),
+    "volume": ("audio", "notifyVolumeInformation"),
+    "playing": ("avContent", "notifyPlayingContentInfo"),
+}
+NOTIFICATION_FIELDS = {name: field for field, (_, name) in NOTIFICATIONS.items()}
 
-    def __init__(
-        self, host, psk, mac=None
-    ):  # mac address is optional but necessary if we want to turn on the TV
-        """Initialize the Sony Bravia RC class."""
+# calls of get_inventory: (key, service, method)
+INVENTORY = (
+    ("system", "system", "getSystemInformation"),
+    ("interface", "system", "getInterfaceInformation"),
+    ("network", "system", "getNetworkSettings"),
+    ("power", "system", "getPowerStatus"),
+    ("volume", "audio", "getVolumeInformation"),
+    ("playing", "avContent", "getPlayingContentInfo"),
+    ("external_inputs", "avContent", "getCurrentExternalInputsStatus"),
+    ("apps", "appControl", "getApplicationList"),
+)
+
+_METHOD_PATTERN = re.compile(rb'"method":\s*"([^"]*)"')
+_ID_PATTERN = re.compile(rb'"id":\s*(\d+)')
+
+if orjson is not None:
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+else:
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        """Encode obj as compact JSON bytes."""
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+# request bodies that do not depend on the TV, built once
+_STATIC_REQUESTS = {}
+_IRCC_ENVELOPE = (
+    b'<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org'
+    b'/soap/envelope/" '
+    b's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><s:Body>'
+    b"<u:X_SendIRCC "
+    b'xmlns:u="urn:schemas-sony-com:service:IRCC:1"><IRCCCode>%s'
+    b"</IRCCCode></u:X_SendIRCC></s:Body></s:Envelope>"
+)
+_IRCC_REQUESTS = {}
+
+
+class BraviaRCBase(object):
+    """Request building and response parsing shared by the sync and async client.
+
+    Nothing in here does any I/O, so the same code is used by `BraviaRC` and
+    `AsyncBraviaRC`.
+    """
+
+    def __init__(self, host, psk, mac=None, cache=None, observer=None, wol=None):
+        """Initialize the state shared by the sync and async client."""
         self._host = host
         self._psk = psk
         self._mac = mac
+        self._wol = wol
         self._cookies = None
         self._commands = []
-        self._content_mapping = []
+        self._command_index = {}
+        self._commands_backoff = 0
+        self._commands_retry_at = 0
+        self._ircc_payloads = {}
+        self._channels = None
+        self._apps = None
+        self._apps_refreshing = False
+        self._icons = IconCache()
+        self._cache = cache
+        self._cache_key = None
+        self._state = BraviaState("off", None, {}, [], frozenset(), None)
+        self._command_listeners = []
+        self._observers = [observer] if observer is not None else []
+        self._request_ids = itertools.count(1)
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Return a client of the TV of a config, e.g. found by discovery.
+
+        Only host, psk and mac of config are used, the other keys like model
+        and services are ignored. kwargs are passed on to the constructor.
+        Raises ValueError when the config has no PSK.
+        """
+        if config.get("psk") is None:
+            raise ValueError("No PSK for the TV %s" % config["host"])
+        return cls(config["host"], config["psk"], config.get("mac"), **kwargs)
+
+    @property
+    def host(self):
+        """Return the host of the TV."""
+        return self._host
+
+    @property
+    def mac(self):
+        """Return the MAC address of the TV, None if unknown."""
+        return self._mac
+
+    @property
+    def wol(self):
+        """Return the `braviapsk.wol.WakeOnLan` used to turn the TV on."""
+        return self._wol if self._wol is not None else default_waker()
+
+    def add_command_listener(self, callback):
+        """Call callback(command) after a command changed the TV.
+
+        Returns a function that removes the listener.
+        """
+        self._command_listeners.append(callback)
+        return lambda: self._command_listeners.remove(callback)
+
+    def _notify_command(self, command):
+        for callback in list(self._command_listeners):
+            try:
+                callback(command)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error in command listener")
+
+    def add_observer(self, callback):
+        """Call callback(event) after every request sent to the TV.
+
+        The event is a `braviapsk.metrics.RequestEvent`, e.g. pass a
+        `braviapsk.metrics.BraviaStats`. Returns a function that removes the
+        observer.
+        """
+        self._observers.append(callback)
+        return lambda: self._observers.remove(callback)
+
+    @staticmethod
+    def _request_method(path, data):
+        """Return the method called by a request body."""
+        if path.endswith("IRCC"):
+            return "X_SendIRCC"
+        match = _METHOD_PATTERN.search(data)
+        return match.group(1).decode("ascii") if match else "unknown"
 
-    def _jdata_build(self, method, params=None):
+    def _report_request(
+        self, path, method, data, elapsed, status, content, error, reused
+    ):
+        """Pass a finished request as `RequestEvent` to the observers.
+
+        method is the method called by data, found in data when None. An HTTP
+        error status is reported as "http" error, whatever error is given.
+        """
+        service = path.rsplit("/", 1)[-1]
+        if method is None:
+            method = self._request_method(path, data)
+        if status is not None and status >= 400:
+            error = "http"
+        event = RequestEvent(
+            self._host,
+            service,
+            method,
+            elapsed,
+            len(data),
+            len(content) if content is not None else 0,
+            status,
+            error,
+            reused,
+        )
+        for callback in list(self._observers):
+            try:
+                callback(event)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error in request observer")
+
+    @staticmethod
+    def _jdata_build(method, params=None):
+        """Return the JSON-RPC request body as bytes.
+
+        Bodies without params are built once and shared by all TVs, their id is
+        replaced by a unique one when they are sent, see `_number_request`.
+        """
         if params:
-            ret = json.dumps(
+            return json_dumps(
                 {"method": method, "params": [params], "id": 1, "version": "1.0"}
             )
-        else:
-            ret = json.dumps(
+        ret = _STATIC_REQUESTS.get(method)
+        if ret is None:
+            ret = _STATIC_REQUESTS[method] = json_dumps(
                 {"method": method, "params": [], "id": 1, "version": "1.0"}
             )
         return ret
 
-    def connect(self, pin, clientid, nickname):
-        """Connect to TV and get authentication cookie.
-
-        Parameters
-        ---------
-        pin: str
-            Pin code show by TV (or 0000 to get Pin Code).
-        clientid: str
-            Client ID.
-        nickname: str
-            Client human friendly name.
-        Returns
-        -------
-        bool
-            True if connected.
-        """
-        authorization = json.dumps(
+    @staticmethod
+    def _register_data(clientid, nickname):
+        """Return the body of the actRegister request."""
+        return json.dumps(
             {
                 "method": "actRegister",
                 "params": [
@@ -76,6 +324,9 @@ class BraviaRC(object):
             }
         ).encode("utf-8")
 
+    @staticmethod
+    def _register_headers(pin):
+        """Return the headers of the actRegister request."""
         headers = {}
         if pin:
             username = ""
@@ -85,22 +336,653 @@ class BraviaRC(object):
                 .replace("\n", "")
             )
             headers["Authorization"] = "Basic %s" % base64string
-            headers["Connection"] = "keep-alive"
+        return headers
+
+    def _ircc_headers(self):
+        """Return the headers of an IRCC request."""
+        return {
+            "X-Auth-PSK": self._psk,
+            "SOAPACTION": '"urn:schemas-sony-com:service:IRCC:1#X_SendIRCC"',
+        }
+
+    @staticmethod
+    def _ircc_body(code):
+        """Return the SOAP envelope sending the given IRCC code."""
+        ret = _IRCC_REQUESTS.get(code)
+        if ret is None:
+            ret = _IRCC_REQUESTS[code] = _IRCC_ENVELOPE % code.encode("UTF-8")
+        return ret
+
+    def _json_headers(self):
+        """Return the headers of a JSON-RPC request."""
+        return {"X-Auth-PSK": self._psk}
 
+    @staticmethod
+    def _request_data(params):
+        """Return the body of a JSON-RPC request given as str or bytes."""
+        if isinstance(params, bytes):
+            return params
+        return params.encode("UTF-8")
+
+    def _number_request(self, data, request_id=None):
+        """Return data with its JSON-RPC id replaced by a unique one, and the id.
+
+        The id is None when data has no id to replace.
+        """
+        start = data.rfind(b'"id"')
+        match = _ID_PATTERN.match(data, start) if start >= 0 else None
+        if match is None:
+            return data, None
+        if request_id is None:
+            request_id = next(self._request_ids)
+        return (
+            b"%s%d%s" % (data[: match.start(1)], request_id, data[match.end(1) :]),
+            request_id,
+        )
+
+    @staticmethod
+    def _is_result(response):
+        """Return True for a decoded JSON-RPC response that is not an error."""
+        return response is not None and "error" not in response
+
+    @staticmethod
+    def _parse_json_response(content, url, params, log_errors, request_id=None):
+        """Decode a JSON-RPC response body and log errors.
+
+        Returns None for a body that is not a JSON-RPC response, e.g. the HTML
+        error page of another device, and for a result that does not answer
+        request_id.
+        """
         try:
-            response = requests.post(
-                "http://" + self._host + "/sony/accessControl",
-                data=authorization,
-                headers=headers,
-                timeout=TIMEOUT,
+            response = json_loads(content)
+        except ValueError:
+            response = None
+        if not isinstance(response, dict):
+            if log_errors:
+                _LOGGER.error("Invalid response of %s: %r" % (url, content[:200]))
+            return None
+        if (
+            request_id is not None
+            and "result" in response
+            and response.get("id", request_id) != request_id
+        ):
+            _LOGGER.error(
+                "Response %s of %s does not answer request %d"
+                % (response.get("id"), url, request_id)
+            )
+            return None
+        if "error" in response and log_errors:
+            if isinstance(params, bytes):
+                params = params.decode("UTF-8")
+            _LOGGER.error(
+                "Invalid response: %s\n  request path: %s\n  request params: %s"
+                % (response, url, params)
+            )
+        return response
+
+    def is_connected(self):
+        """Check if connection is established."""
+        if self._cookies is None:
+            return False
+        else:
+            return True
+
+    def _wakeonlan(self):
+        if self._mac is not None:
+            self.wol.wake(self._mac)
+
+    @staticmethod
+    def _parse_app_list(resp):
+        if resp is None:
+            return None
+        if resp.get("error"):
+            _LOGGER.error("ERROR: %s" % resp.get("error"))
+        else:
+            return resp.get("result")[0]
+
+    def _update_app_catalog(self, app_list):
+        """Index a received app list, keep the old catalog if there is none."""
+        if app_list is not None:
+            self._apps = AppCatalog(app_list)
+        return app_list
+
+    def _apps_refresh_due(self, max_age):
+        """Return True if the caller has to refresh the app catalog now."""
+        if self._apps_refreshing or self._apps.age <= max_age:
+            return False
+        self._apps_refreshing = True
+        return True
+
+    def _missing_icons(self, apps):
+        """Return the icon URLs of apps that are not cached, without duplicates."""
+        return list(
+            collections.OrderedDict.fromkeys(
+                app.icon for app in apps if app.icon and app.icon not in self._icons
             )
+        )
+
+    @staticmethod
+    def _parse_open_app(resp):
+        if resp is not None and resp.get("error"):
+            _LOGGER.error("ERROR: %s" % resp.get("error"))
+
+    @staticmethod
+    def _parse_content_page(resp):
+        """Return the content of a getContentList page, None when done."""
+        if resp is not None and not resp.get("error"):
+            if len(resp.get("result")[0]) == 0:
+                return None
+            return resp.get("result")[0]
+        return None
+
+    @staticmethod
+    def _parse_content_count(resp):
+        """Return the count of a getContentCount response, None if unknown."""
+        if resp is not None and not resp.get("error"):
+            return resp.get("result")[0].get("count")
+        return None
+
+    @staticmethod
+    def _content_ranges(count):
+        """Split count contents in (start, stop) ranges of one page each."""
+        return [
+            (start, min(start + CONTENT_PAGE_SIZE, count))
+            for start in range(0, count, CONTENT_PAGE_SIZE)
+        ]
+
+    @staticmethod
+    def _content_range_params(source, content_index, stop):
+        params = {"source": source, "stIdx": content_index}
+        if stop is not None:
+            params["cnt"] = min(CONTENT_PAGE_SIZE, stop - content_index)
+        return params
+
+    @staticmethod
+    def _parse_input_content(resp):
+        if resp is not None and not resp.get("error"):
+            return resp.get("result")[0]
+        return []
+
+    @staticmethod
+    def _parse_source_list(resp, sources):
+        """Return the source entries of a getSourceList response to enumerate."""
+        if resp is not None and not resp.get("error"):
+            return [
+                result
+                for result in resp.get("result")[0]
+                if result["source"] in sources
+            ]
+        return []
+
+    def _build_content_mapping(self, content_list):
+        """Index the content list, return the title to URI mapping."""
+        self._channels = ChannelDirectory(content_list)
+        return self._channels.to_mapping()
+
+    @staticmethod
+    def _parse_playing_info(resp):
+        return_value = {}
+        if resp is not None and not resp.get("error"):
+            playing_content_data = resp.get("result")[0]
+            return_value["programTitle"] = playing_content_data.get("programTitle")
+            return_value["title"] = playing_content_data.get("title")
+            return_value["programMediaType"] = playing_content_data.get(
+                "programMediaType"
+            )
+            return_value["dispNum"] = playing_content_data.get("dispNum")
+            return_value["source"] = playing_content_data.get("source")
+            return_value["uri"] = playing_content_data.get("uri")
+            return_value["durationSec"] = playing_content_data.get("durationSec")
+            return_value["startDateTime"] = playing_content_data.get("startDateTime")
+        return return_value
+
+    @staticmethod
+    def _parse_power_status(resp):
+        return_value = "off"  # by default the TV is turned off
+        if resp is not None and not resp.get("error"):
+            power_data = resp.get("result")[0]
+            return_value = power_data.get("status")
+        elif resp is not None and any(code in resp["error"] for code in AUTH_ERRORS):
+            # The TV is on the network but refuses the PSK.
+            return_value = "unauthorized"
+        return return_value
+
+    def _cache_get(self, name):
+        """Return a value of this TV from the persistent cache, if any."""
+        if self._cache is None or self._cache_key is None:
+            return None
+        return self._cache.get(self._cache_key, name)
+
+    def _cache_set(self, name, value):
+        """Store a value of this TV in the persistent cache, if any."""
+        if self._cache is not None and self._cache_key is not None:
+            self._cache.set(self._cache_key, name, value)
+
+    def _clear_cached_data(self):
+        """Forget the command codes and content list held in memory."""
+        self._commands = []
+        self._command_index = {}
+        self._commands_backoff = 0
+        self._commands_retry_at = 0
+        self._ircc_payloads = {}
+        self._channels = None
+        if self._cache is not None and self._cache_key is not None:
+            self._cache.invalidate(self._cache_key)
+
+    def _set_commands(self, commands):
+        self._commands = commands
+        self._command_index = {
+            command_data.get("name"): command_data.get("value")
+            for command_data in commands
+        }
+        self._commands_backoff = 0
+        self._commands_retry_at = 0
+
+    def _parse_commands(self, resp):
+        if resp is not None and not resp.get("error"):
+            self._set_commands(resp.get("result")[1])
+            return
+        if resp is not None:
+            error = resp.get("error")
+            if "not power-on" not in error:
+                _LOGGER.error("JSON request error: " + json.dumps(resp, indent=4))
+        # Do not ask the TV again for every key press while it cannot answer.
+        self._commands_backoff = min(
+            max(self._commands_backoff * 2, COMMANDS_BACKOFF_MIN),
+            COMMANDS_BACKOFF_MAX,
+        )
+        self._commands_retry_at = time.monotonic() + self._commands_backoff
+
+    def _commands_refresh_due(self):
+        """Return True if the command list is missing and may be requested."""
+        return (
+            len(self._command_index) == 0
+            and time.monotonic() >= self._commands_retry_at
+        )
+
+    def _lookup_command_code(self, command_name):
+        return self._command_index.get(command_name)
+
+    def _prepare_payloads(self, command_names):
+        """Build the IRCC requests of the given commands, return the count."""
+        for command_name in command_names:
+            code = self._lookup_command_code(command_name)
+            if code is not None:
+                self._ircc_payloads[command_name] = self._ircc_body(code)
+        return len(self._ircc_payloads)
+
+    @staticmethod
+    def _parse_volume_info(resp):
+        if resp is None:
+            return None
+        error = resp.get("error")
+        if not error:
+            results = resp.get("result")[0]
+            for result in results:
+                if result.get("target") == "speaker":
+                    return result
+        elif 40005 not in error:  # 40005 = "Display is Turned off"
+            _LOGGER.error("JSON request error:" + json.dumps(resp, indent=4))
+        return None
+
+    @staticmethod
+    def _parse_system_info(resp):
+        return_value = {}
+        if resp is not None and not resp.get("error"):
+            system_content_data = resp.get("result")[0]
+            return_value["name"] = system_content_data.get("name")
+            return_value["model"] = system_content_data.get("model")
+            return_value["mac"] = system_content_data.get("mac")
+            return_value["serial"] = system_content_data.get("serial")
+            return_value["language"] = system_content_data.get("language")
+        return return_value
+
+    @staticmethod
+    def _parse_network_info(resp):
+        return_value = {}
+        if resp is not None and not resp.get("error"):
+            network_content_data = resp.get("result")[0]
+            return_value["mac"] = network_content_data[0]["hwAddr"]
+            return_value["ip"] = network_content_data[0]["ipAddrV4"]
+            return_value["gateway"] = network_content_data[0]["gateway"]
+        return return_value
+
+    @staticmethod
+    def _parse_external_input_status(resp):
+        return_value = []
+        if resp is not None and not resp.get("error"):
+            return_value = resp.get("result")[0]
+        return return_value
+
+    @staticmethod
+    def _parse_interface_info(resp):
+        return_value = {}
+        if resp is not None and not resp.get("error"):
+            return_value = resp.get("result")[0]
+        return return_value
+
+    def _batch_groups(self, calls):
+        """Give the calls unique ids and group them per service, in call order.
+
+        Returns the request ids in call order and an ordered dict of request
+        path to [(method, request_id, body)].
+        """
+        request_ids = []
+        groups = collections.OrderedDict()
+        for service, method, params in calls:
+            data, request_id = self._number_request(self._jdata_build(method, params))
+            request_ids.append(request_id)
+            groups.setdefault("sony/" + service, []).append((method, request_id, data))
+        return request_ids, groups
+
+    @staticmethod
+    def _demultiplex(request_ids, responses):
+        """Return the responses in the order of request_ids, None if missing."""
+        by_id = {
+            response.get("id"): response
+            for response in responses
+            if response is not None
+        }
+        return [by_id.get(request_id) for request_id in request_ids]
+
+    def _parse_inventory(self, responses):
+        """Return the inventory dict of the responses to the INVENTORY calls."""
+        parsers = {
+            "system": self._parse_system_info,
+            "interface": self._parse_interface_info,
+            "network": self._parse_network_info,
+            "power": self._parse_power_status,
+            "volume": self._parse_volume_info,
+            "playing": self._parse_playing_info,
+            "external_inputs": self._parse_external_input_status,
+            "apps": self._parse_app_list,
+        }
+        inventory = collections.OrderedDict(
+            (key, parsers[key](response))
+            for (key, _, _), response in zip(INVENTORY, responses)
+        )
+        self._update_app_catalog(inventory["apps"])
+        return inventory
+
+    def _build_state(self, power, refreshed=None):
+        """Return and remember a snapshot, refreshed maps fields to new values."""
+        if refreshed is None:
+            refreshed = {}
+            stale = frozenset(POWER_DEPENDENT_FIELDS)
+        else:
+            stale = frozenset()
+        self._state = self._state._replace(
+            power=power, stale=stale, time=time.time(), **refreshed
+        )
+        return self._state
+
+    @staticmethod
+    def _switch_notifications_data(enabled=None, disabled=None):
+        """Return a switchNotifications request, without lists it only queries."""
+        params = {}
+        if enabled is not None:
+            params = {"enabled": enabled, "disabled": disabled or []}
+        return json_dumps(
+            {
+                "method": "switchNotifications",
+                "params": [params],
+                "id": 1,
+                "version": "1.0",
+            }
+        )
+
+    @staticmethod
+    def _parse_switch_notifications(resp):
+        """Return the enabled and disabled notifications of the response."""
+        if resp is None or resp.get("error") or not resp.get("result"):
+            return [], []
+        result = resp["result"][0]
+        return result.get("enabled", []), result.get("disabled", [])
+
+    def parse_notification(self, message):
+        """Return (field, value) of a notification pushed by the TV.
+
+        The value has the format of the matching get_* method. Returns None
+        for messages that are not a known notification.
+        """
+        if not isinstance(message, dict):
+            return None
+        field = NOTIFICATION_FIELDS.get(message.get("method"))
+        params = message.get("params") or []
+        if field is None or not params:
+            return None
+        if field == "power":
+            return field, self._parse_power_status({"result": params})
+        if field == "volume":
+            return field, self._parse_volume_info({"result": [params]})
+        return field, self._parse_playing_info({"result": params})
+
+    @staticmethod
+    def _volume_params(volume):
+        # API expects string int value within 0..100 range.
+        api_volume = str(int(round(volume * 100)))
+        return {"target": "speaker", "volume": api_volume}
+
+    def add_seconds(self, tm, secs):
+        """Add seconds to time (HH:MM:SS)."""
+        fulldate = datetime.datetime(100, 1, 1, tm.hour, tm.minute, tm.second)
+        fulldate = fulldate + datetime.timedelta(seconds=secs)
+        return fulldate.time()
+
+    def playing_time(self, startdatetime, durationsec):
+        """Return starttime and endtime (HH:MM) of TV program."""
+        # startdatetime format 2017-03-24T00:00:00+0100
+        return_value = {}
+        startdatetime = startdatetime[:19]  # Remove timezone
+
+        starttime = datetime.datetime.strptime(
+            startdatetime, "%Y-%m-%dT%H:%M:%S"
+        ).time()
+        endtime = self.add_seconds(starttime, durationsec)
+
+        return_value["start_time"] = starttime.strftime("%H:%M")
+        return_value["end_time"] = endtime.strftime("%H:%M")
+        return return_value
+
+
+class BraviaRC(BraviaRCBase):
+    """Representation of a Sony Bravia TV."""
+
+    def __init__(
+        self,
+        host,
+        psk,
+        mac=None,
+        pool_size=POOL_SIZE,
+        cache=None,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=TIMEOUT,
+        observer=None,
+        read_ttl=None,
+        wol=None,
+        transport=DEFAULT_TRANSPORT,
+        recorder=None,
+    ):  # mac address is optional but necessary if we want to turn on the TV
+        """Initialize the Sony Bravia RC class.
+
+        A `braviapsk.cache.BraviaCache` can be given as cache to keep the command
+        codes and content list across restarts, a `braviapsk.metrics.BraviaStats`
+        as observer to collect request metrics. read_ttl overrides the seconds
+        read results are reused, see `braviapsk.readcache.READ_CACHE_TTL`. wol
+        is a `braviapsk.wol.WakeOnLan` with e.g. other broadcast addresses,
+        by default one shared by all TVs is used. transport is "http" for
+        persistent http.client connections, "requests" for a requests session
+        or a factory, see `braviapsk.transport`. A
+        `braviapsk.recorder.TrafficRecorder` as recorder logs every request and
+        response for replaying them later.
+
+        An instance can be shared by any number of threads.
+        """
+        super().__init__(host, psk, mac, cache, observer, wol)
+        self._lock = threading.Lock()
+        self._read_cache = ReadCache(read_ttl)
+        self.add_command_listener(self._read_cache.invalidate_command)
+        self._pool_size = pool_size
+        self._transport_factory = transport_factory(transport)
+        self._transport = None
+        self._recorder = recorder
+        self._executor = None
+        self._timeout = (connect_timeout, read_timeout)
+        self._breaker = CircuitBreaker()
+        self._notifier = None
+        self._notifier_lock = threading.Lock()
+
+    @property
+    def health(self):
+        """Return the `CircuitBreaker` tracking the reachability of the TV."""
+        return self._breaker
+
+    def probe(self):
+        """Return True if the TV accepts a TCP connection."""
+        return probe(self._host, self._timeout[0])
+
+    def __enter__(self):
+        """Enter the runtime context, connections are opened on first use."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the connections when leaving the runtime context."""
+        self.close()
+
+    def _get_transport(self):
+        """Return the keep-alive transport, create it if needed."""
+        with self._lock:
+            if self._transport is None:
+                transport = self._transport_factory(
+                    self._host, self._pool_size, *self._timeout
+                )
+                if self._recorder is not None:
+                    transport = self._recorder.transport(transport, self._host)
+                self._transport = transport
+            return self._transport
+
+    def _get_executor(self):
+        """Return the threads used to send requests in parallel."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._pool_size, thread_name_prefix="braviarc"
+                )
+            return self._executor
+
+    def close(self):
+        """Close all pooled connections to the TV."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            transport, self._transport = self._transport, None
+        with self._notifier_lock:
+            notifier, self._notifier = self._notifier, None
+        if notifier is not None:
+            notifier.stop()
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if transport is not None:
+            transport.close()
+        self._read_cache.invalidate()
+
+    def _check_breaker(self):
+        """Raise TVUnavailableError if the TV is known to be unreachable."""
+        breaker = self._breaker
+        if not breaker.is_open:
+            return
+        if not breaker.allow_trial():
+            raise TVUnavailableError(
+                "%s is unreachable, retrying in %.1fs" % (self._host, breaker.retry_in)
+            )
+        if not self.probe():
+            breaker.record_failure()
+            raise TVUnavailableError("%s is unreachable" % self._host)
+
+    def _post(self, path, data, headers, method=None, parse=None):
+        """Post data to the TV and report the request to the observers.
+
+        method is the method called by data, see `_report_request`. With parse
+        the body decoded by parse(content) is returned instead of the
+        `Response`, and reported as "api" error when it is None or a JSON-RPC
+        error.
+        """
+        if not self._observers:
+            response = self._send_post(path, data, headers)
+            return response if parse is None else parse(response.content)
+        started = time.perf_counter()
+        try:
+            response = self._send_post(path, data, headers)
+        except Exception as exception_instance:
+            if isinstance(exception_instance, TVUnavailableError):
+                error = "unavailable"
+            elif isinstance(exception_instance, Timeout):
+                error = "timeout"
+            else:
+                error = "connection"
+            elapsed = time.perf_counter() - started
+            self._report_request(path, method, data, elapsed, None, None, error, None)
+            raise
+        elapsed = time.perf_counter() - started
+        result = response if parse is None else parse(response.content)
+        self._report_request(
+            path,
+            method,
+            data,
+            elapsed,
+            response.status,
+            response.content,
+            None if parse is None or self._is_result(result) else "api",
+            response.reused,
+        )
+        return result
+
+    def _send_post(self, path, data, headers):
+        """Post data to the TV over a pooled keep-alive connection.
+
+        A request failing on a reused connection is sent once more by the
+        transport, see `braviapsk.transport.HTTPTransport.post`.
+        """
+        self._check_breaker()
+        try:
+            response = self._get_transport().post(path, data, headers)
+        except TransportError:
+            self._breaker.record_failure()
+            raise
+        self._breaker.record_success()
+        return response
+
+    def connect(self, pin, clientid, nickname):
+        """Connect to TV and get authentication cookie.
+
+        Parameters
+        ---------
+        pin: str
+            Pin code show by TV (or 0000 to get Pin Code).
+        clientid: str
+            Client ID.
+        nickname: str
+            Client human friendly name.
+        Returns
+        -------
+        bool
+            True if connected.
+        """
+        authorization = self._register_data(clientid, nickname)
+        headers = self._register_headers(pin)
+
+        try:
+            response = self._post("sony/accessControl", authorization, headers)
             response.raise_for_status()
 
-        except requests.exceptions.HTTPError as exception_instance:
+        except HTTPError as exception_instance:
             _LOGGER.exception("[W] HTTPError: " + str(exception_instance))
             return False
 
-        except requests.exceptions.Timeout as exception_instance:
+        except TVUnavailableError as exception_instance:
+            _LOGGER.error("[W] " + str(exception_instance))
+            return False
+
+        except Timeout as exception_instance:
             _LOGGER.exception("[W] Timeout occurred: " + str(exception_instance))
             return False
 
@@ -117,60 +999,23 @@ class BraviaRC(object):
 
         return False
 
-    def is_connected(self):
-        """Check if connection is established."""
-        if self._cookies is None:
-            return False
-        else:
-            return True
-
-    def _wakeonlan(self):
-        if self._mac is not None:
-            addr_byte = self._mac.split(":")
-            hw_addr = struct.pack(
-                "BBBBBB",
-                int(addr_byte[0], 16),
-                int(addr_byte[1], 16),
-                int(addr_byte[2], 16),
-                int(addr_byte[3], 16),
-                int(addr_byte[4], 16),
-                int(addr_byte[5], 16),
-            )
-            msg = b"\xff" * 6 + hw_addr * 16
-            socket_instance = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            socket_instance.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            socket_instance.sendto(msg, ("<broadcast>", 9))
-            socket_instance.close()
-
     def send_req_ircc(self, params, log_errors=True):
         """Send an IRCC command via HTTP to Sony Bravia."""
         if params is None:
             return False
-        headers = {
-            "X-Auth-PSK": self._psk,
-            "SOAPACTION": '"urn:schemas-sony-com:service:IRCC:1#X_SendIRCC"',
-        }
-        data = (
-            '<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org'
-            + '/soap/envelope/" '
-            + 's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><s:Body>'
-            + "<u:X_SendIRCC "
-            + 'xmlns:u="urn:schemas-sony-com:service:IRCC:1"><IRCCCode>'
-            + params
-            + "</IRCCCode></u:X_SendIRCC></s:Body></s:Envelope>"
-        ).encode("UTF-8")
+        return self._send_ircc_body(self._ircc_body(params), log_errors)
+
+    def _send_ircc_body(self, data, log_errors=True):
         try:
-            response = requests.post(
-                "http://" + self._host + "/sony/IRCC",
-                headers=headers,
-                data=data,
-                timeout=TIMEOUT,
-            )
-        except requests.exceptions.HTTPError as exception_instance:
+            response = self._post("sony/IRCC", data, self._ircc_headers())
+        except HTTPError as exception_instance:
             if log_errors:
                 _LOGGER.error("HTTPError: " + str(exception_instance))
 
-        except requests.exceptions.Timeout as exception_instance:
+        except TVUnavailableError as exception_instance:
+            _LOGGER.debug(str(exception_instance))
+
+        except Timeout as exception_instance:
             if log_errors:
                 _LOGGER.error("Timeout occurred: " + str(exception_instance))
 
@@ -178,23 +1023,46 @@ class BraviaRC(object):
             if log_errors:
                 _LOGGER.error("Exception: " + str(exception_instance))
         else:
+            self._notify_command("IRCC")
             content = response.content
             return content
 
     def bravia_req_json(self, url, params, log_errors=True):
-        """Send request command via HTTP json to Sony Bravia."""
+        """Send request command via HTTP json to Sony Bravia.
+
+        params is the request body as str or bytes, see `_jdata_build`.
+        Identical reads (get* methods) sent at the same time share one request.
+        """
+        data = self._request_data(params)
+        method = self._request_method(url, data)
+        if method.startswith("get"):
+            return self._read_cache.get(
+                (method, url, data),
+                lambda: self._send_json(url, method, data, log_errors),
+            )
+        return self._send_json(url, method, data, log_errors)
+
+    def _send_json(self, url, method, data, log_errors, request_id=None):
+        if request_id is None:
+            data, request_id = self._number_request(data)
         try:
-            response = requests.post(
-                "http://" + self._host + "/" + url,
-                data=params.encode("UTF-8"),
-                headers={"X-Auth-PSK": self._psk},
-                timeout=TIMEOUT,
+            result = self._post(
+                url,
+                data,
+                self._json_headers(),
+                method,
+                lambda content: self._parse_json_response(
+                    content, url, data, log_errors, request_id
+                ),
             )
-        except requests.exceptions.HTTPError as exception_instance:
+        except HTTPError as exception_instance:
             if log_errors:
                 _LOGGER.error("HTTPError: " + str(exception_instance))
 
-        except requests.exceptions.Timeout as exception_instance:
+        except TVUnavailableError as exception_instance:
+            _LOGGER.debug(str(exception_instance))
+
+        except Timeout as exception_instance:
             if log_errors:
                 _LOGGER.error("Timeout occurred: " + str(exception_instance))
 
@@ -203,158 +1071,413 @@ class BraviaRC(object):
                 _LOGGER.error("Exception: " + str(exception_instance))
 
         else:
-            response = json.loads(response.content.decode("utf-8"))
-            if "error" in response and log_errors:
-                _LOGGER.error(
-                    "Invalid response: %s\n  request path: %s\n  request params: %s"
-                    % (response, url, params)
-                )
-            return response
+            if not method.startswith("get"):
+                # Drop cached reads the write changed and nudge the pollers.
+                self._notify_command(method)
+            return result
+
+    def batch(self, calls, log_errors=True):
+        """Send JSON-RPC calls with as few round trips as possible.
+
+        calls is an iterable of (service, method, params) with params a dict or
+        None, e.g. ("system", "getPowerStatus", None). The calls of a service
+        are sent in order over one keep-alive connection, the services in
+        parallel. Returns the responses in call order, matched by request id,
+        None for calls that failed.
+        """
+        request_ids, groups = self._batch_groups(calls)
+        if len(groups) > 1:
+            responses = self._get_executor().map(
+                self._send_group,
+                list(groups),
+                list(groups.values()),
+                itertools.repeat(log_errors),
+            )
+        else:
+            responses = [
+                self._send_group(path, group, log_errors)
+                for path, group in groups.items()
+            ]
+        return self._demultiplex(request_ids, itertools.chain.from_iterable(responses))
+
+    def _send_group(self, path, group, log_errors):
+        """Send the requests of one service one after the other."""
+        responses = []
+        for method, request_id, data in group:
+            responses.append(
+                self._send_json(path, method, data, log_errors, request_id)
+            )
+        return responses
+
+    def get_inventory(self):
+        """Return everything about the TV from one round of parallel requests.
+
+        The ordered dict holds the system, interface and network information,
+        power status, volume, playing content, external inputs and apps, see
+        INVENTORY.
+        """
+        return self._parse_inventory(
+            self.batch(
+                [(service, method, None) for _, service, method in INVENTORY], False
+            )
+        )
 
     def send_command(self, command):
         """Send command to the TV."""
-        self.send_req_ircc(self.get_command_code(command))
+        payload = self._ircc_payloads.get(command)
+        if payload is not None:
+            return self._send_ircc_body(payload)
+        return self.send_req_ircc(self.get_command_code(command))
+
+    def pipeline(self, key_spacing=KEY_SPACING):
+        """Return a `CommandPipeline` that queues commands for this TV."""
+        return CommandPipeline(self, key_spacing)
+
+    def prepare_commands(self, command_names=COMMON_COMMANDS):
+        """Resolve the IRCC requests of commands ahead of sending them.
+
+        Returns the number of commands that are ready to be sent without any
+        lookup.
+        """
+        if self._commands_refresh_due():
+            self._refresh_commands()
+        return self._prepare_payloads(command_names)
 
     def load_app_list(self):
-        """Get the list of installed apps."""
+        """Get the list of installed apps, it also updates the app catalog."""
         resp = self.bravia_req_json(
             "sony/appControl", self._jdata_build("getApplicationList")
         )
-        if resp.get("error"):
-            _LOGGER.error("ERROR: %s" % resp.get("error"))
-        else:
-            return resp.get("result")[0]
+        return self._update_app_catalog(self._parse_app_list(resp))
+
+    def get_app_catalog(self, max_age=APP_CATALOG_TTL):
+        """Return the `braviapsk.apps.AppCatalog` of the TV.
+
+        The app list is loaded on first use. Once it is older than max_age
+        seconds the catalog is still returned at once while a fresh list is
+        requested in the background. Returns an empty catalog while the list
+        cannot be loaded.
+        """
+        catalog = self._apps
+        if catalog is None:
+            self.load_app_list()
+            return self._apps or AppCatalog()
+        with self._lock:
+            refresh = self._apps_refresh_due(max_age)
+        if refresh:
+            self._get_executor().submit(self._refresh_apps)
+        return catalog
+
+    def _refresh_apps(self):
+        try:
+            self.load_app_list()
+        finally:
+            self._apps_refreshing = False
+
+    def open_app_by_name(self, name):
+        """Open the app best matching name, see `braviapsk.apps.AppCatalog.find`.
+
+        Returns the opened `braviapsk.apps.App`, None if no app matches. With
+        the catalog loaded this takes a single request, the app list is only
+        requested again when name is not found.
+        """
+        catalog = self._apps
+        app = self.get_app_catalog().find(name)
+        if app is None and catalog is not None and self.load_app_list() is not None:
+            app = self._apps.find(name)
+        if app is not None:
+            self.open_app(app.uri)
+        return app
+
+    def fetch_app_icons(self, apps=None):
+        """Fetch the icons of apps, all by default, concurrently into the cache.
+
+        Returns a dict of app URI to icon bytes, None for apps without an icon
+        or of which the icon could not be fetched.
+        """
+        apps = list(self.get_app_catalog() if apps is None else apps)
+        missing = self._missing_icons(apps)
+        for url, icon in zip(missing, self._get_executor().map(fetch_icon, missing)):
+            if icon is not None:
+                self._icons.put(url, icon)
+        return collections.OrderedDict(
+            (app.uri, self._icons.get(app.icon) if app.icon else None) for app in apps
+        )
+
+    def get_app_icon(self, app):
+        """Return the icon of an `braviapsk.apps.App` or app name, None if unknown."""
+        if not isinstance(app, App):
+            app = self.get_app_catalog().find(app)
+        if app is None:
+            return None
+        return self.fetch_app_icons([app])[app.uri]
 
     def open_app(self, uri):
         """Open app with given uri."""
         resp = self.bravia_req_json(
             "sony/appControl", self._jdata_build("setActiveApp", {"uri": uri})
         )
-        if resp.get("error"):
-            _LOGGER.error("ERROR: %s" % resp.get("error"))
+        self._parse_open_app(resp)
 
-    def get_source(self, source):
-        """Return list of sources."""
-        original_content_list = []
-        content_index = 0
-        while True:
+    def get_content_count(self, source):
+        """Return the number of contents of a source, None if unknown."""
+        resp = self.bravia_req_json(
+            "sony/avContent",
+            self._jdata_build("getContentCount", {"source": source}),
+            log_errors=False,
+        )
+        return self._parse_content_count(resp)
+
+    def _iter_content_range(self, source, start, stop=None):
+        """Yield the pages of contents of a source from index start to stop."""
+        content_index = start
+        while stop is None or content_index < stop:
             resp = self.bravia_req_json(
                 "sony/avContent",
                 self._jdata_build(
-                    "getContentList", {"source": source, "stIdx": content_index}
+                    "getContentList",
+                    self._content_range_params(source, content_index, stop),
                 ),
             )
-            if not resp.get("error"):
-                if len(resp.get("result")[0]) == 0:
-                    break
-                else:
-                    content_index = resp.get("result")[0][-1]["index"] + 1
-                original_content_list.extend(resp.get("result")[0])
-            else:
+            page = self._parse_content_page(resp)
+            if page is None:
                 break
-        return original_content_list
+            content_index = page[-1]["index"] + 1
+            yield page
+
+    def _get_content_range(self, source, start, stop=None):
+        return [
+            content
+            for page in self._iter_content_range(source, start, stop)
+            for content in page
+        ]
+
+    def _submit_source(self, executor, source, count):
+        """Submit fetching the pages of a source, one future per page."""
+        if count is None:
+            return [executor.submit(self._get_content_range, source, 0)]
+        return [
+            executor.submit(self._get_content_range, source, start, stop)
+            for start, stop in self._content_ranges(count)
+        ]
+
+    def get_source(self, source, concurrent=False):
+        """Return list of sources.
+
+        With concurrent the number of contents is requested first, after which
+        all pages are fetched in parallel.
+        """
+        if not concurrent:
+            return self._get_content_range(source, 0)
+        futures = self._submit_source(
+            self._get_executor(), source, self.get_content_count(source)
+        )
+        return [content for future in futures for content in future.result()]
 
-    def load_source_list(self):
-        """Load source list from Sony Bravia."""
-        original_content_list = []
+    def _load_cache_key(self):
+        """Identify the TV in the persistent cache by its model and serial."""
+        if self._cache is not None and self._cache_key is None:
+            self._cache_key = self._cache.make_key(self.get_system_info())
+        return self._cache_key
+
+    def invalidate_cache(self):
+        """Drop the command codes and content list, also from the cache."""
+        self._load_cache_key()
+        self._clear_cached_data()
+
+    def load_source_list(self, concurrent=False):
+        """Load source list from Sony Bravia.
+
+        With concurrent all sources and pages are fetched in parallel.
+        """
+        self._load_cache_key()
+        content_list = self._cache_get("content")
+        if content_list is None:
+            content_list = [
+                content
+                for page in self._iter_content_pages(concurrent, ordered=True)
+                for content in page
+            ]
+            if content_list:
+                self._cache_set("content", content_list)
+        return self._build_content_mapping(content_list)
+
+    def get_channel_directory(self, concurrent=False):
+        """Return the `ChannelDirectory` of the TV, load it if needed.
+
+        An empty directory is loaded again, e.g. when the TV was in standby.
+        """
+        if not self._channels:
+            self.load_source_list(concurrent)
+        return self._channels
+
+    def iter_source_list(self, concurrent=False):
+        """Yield the contents of all sources as soon as they are received.
+
+        With concurrent the pages are fetched in parallel and contents are
+        yielded in the order their page arrives, not in channel order.
+        """
+        for page in self._iter_content_pages(concurrent, ordered=False):
+            for content in page:
+                yield content
+
+    def _get_sources(self, scheme, sources):
         resp = self.bravia_req_json(
-            "sony/avContent", self._jdata_build("getSourceList", {"scheme": "tv"})
+            "sony/avContent", self._jdata_build("getSourceList", {"scheme": scheme})
         )
-        if not resp.get("error"):
-            results = resp.get("result")[0]
-            for result in results:
-                # tv:dvbc = via cable, tv:dvbt = via DTT, tv:dvbs = via satellite
-                # tv:isdbgt = Brazilian Digital TV standard, tv:atsct = via atsct
-                # tv:analog = via analog input
-                if result["source"] in [
-                    "tv:dvbc",
-                    "tv:dvbt",
-                    "tv:dvbs",
-                    "tv:isdbt",
-                    "tv:isdbbs",
-                    "tv:isdbcs",
-                    "tv:isdbgt",
-                    "tv:atsct",
-                    "tv:analog",
-                ]:
-                    original_content_list.extend(self.get_source(result["source"]))
+        return self._parse_source_list(resp, sources)
 
+    def _get_input_content(self, result):
         resp = self.bravia_req_json(
-            "sony/avContent", self._jdata_build("getSourceList", {"scheme": "extInput"})
+            "sony/avContent", self._jdata_build("getContentList", result)
         )
-        if not resp.get("error"):
-            results = resp.get("result")[0]
-            for result in results:
-                if result["source"] in (
-                    "extInput:hdmi",
-                    "extInput:composite",
-                    "extInput:component",
-                    "extInput:cec",
-                ):  # physical inputs
-                    resp = self.bravia_req_json(
-                        "sony/avContent", self._jdata_build("getContentList", result)
-                    )
-                    if not resp.get("error"):
-                        original_content_list.extend(resp.get("result")[0])
-
-        return_value = collections.OrderedDict()
-        for content_item in original_content_list:
-            return_value[content_item["title"]] = content_item["uri"]
-        return return_value
+        return self._parse_input_content(resp)
+
+    def _iter_content_pages(self, concurrent, ordered):
+        if not concurrent:
+            for result in self._get_sources("tv", TV_SOURCES):
+                for page in self._iter_content_range(result["source"], 0):
+                    yield page
+            for result in self._get_sources("extInput", EXT_INPUT_SOURCES):
+                yield self._get_input_content(result)
+            return
+
+        executor = self._get_executor()
+        futures = []
+        try:
+            tv_sources, input_sources = executor.map(
+                self._get_sources,
+                ("tv", "extInput"),
+                (TV_SOURCES, EXT_INPUT_SOURCES),
+            )
+            counts = executor.map(
+                self.get_content_count, [result["source"] for result in tv_sources]
+            )
+            for result, count in zip(tv_sources, counts):
+                futures.extend(self._submit_source(executor, result["source"], count))
+            futures.extend(
+                executor.submit(self._get_input_content, result)
+                for result in input_sources
+            )
+            for future in futures if ordered else as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _switch_notifications(self, websocket, data):
+        data, request_id = self._number_request(data)
+        websocket.send_text(data)
+        deadline = time.monotonic() + self._timeout[1]
+        while True:
+            if time.monotonic() > deadline:
+                raise Timeout("%s did not answer switchNotifications" % self._host)
+            message = json_loads(websocket.receive())
+            if isinstance(message, dict) and message.get("id") == request_id:
+                return self._parse_switch_notifications(message)
+
+    def open_notifications(self, service, names):
+        """Open the notification channel of a service and enable names.
+
+        Returns the `braviapsk.websocket.WebSocket` and the names the TV
+        enabled. Raises WebSocketError or OSError when the TV has no
+        notification channel or does not answer within the read timeout.
+        """
+        websocket = WebSocket.connect(
+            self._host, "/sony/" + service, self._json_headers(), self._timeout[0]
+        )
+        try:
+            websocket.settimeout(self._timeout[1])
+            enabled, disabled = self._switch_notifications(
+                websocket, self._switch_notifications_data()
+            )
+            available = enabled + disabled
+            wanted = [item for item in available if item.get("name") in names]
+            if wanted:
+                enabled, _ = self._switch_notifications(
+                    websocket,
+                    self._switch_notifications_data(
+                        wanted, [item for item in available if item not in wanted]
+                    ),
+                )
+            else:
+                enabled = []
+        except BaseException:
+            websocket.close()
+            raise
+        # Notifications may not come for hours.
+        websocket.settimeout(None)
+        return websocket, [
+            item["name"] for item in enabled if item.get("name") in names
+        ]
+
+    def subscribe(self, callback, fields=None):
+        """Call callback(field, old_value, new_value) when the TV changes.
+
+        Power, volume and playing content are pushed by TVs that support
+        notifications, the other fields and TVs are polled, see
+        `braviapsk.notifications.BraviaNotifier`. Returns a function that
+        removes the subscription. The websockets are closed and polling stops
+        when the last subscription is removed, until the next subscribe.
+        """
+        # Imported here, the notifications module imports this one.
+        from .notifications import BraviaNotifier
+
+        with self._notifier_lock:
+            if self._notifier is None:
+                self._notifier = BraviaNotifier(self)
+            notifier = self._notifier
+            remove = notifier.subscribe(callback, fields)
+            notifier.start()
+
+        def unsubscribe():
+            with self._notifier_lock:
+                remove()
+                if not notifier.subscribed:
+                    notifier.stop()
+
+        return unsubscribe
 
     def get_playing_info(self):
         """Get information on program that is shown on TV."""
-        return_value = {}
         resp = self.bravia_req_json(
             "sony/avContent", self._jdata_build("getPlayingContentInfo", None), False
         )
-        if resp is not None and not resp.get("error"):
-            playing_content_data = resp.get("result")[0]
-            return_value["programTitle"] = playing_content_data.get("programTitle")
-            return_value["title"] = playing_content_data.get("title")
-            return_value["programMediaType"] = playing_content_data.get(
-                "programMediaType"
-            )
-            return_value["dispNum"] = playing_content_data.get("dispNum")
-            return_value["source"] = playing_content_data.get("source")
-            return_value["uri"] = playing_content_data.get("uri")
-            return_value["durationSec"] = playing_content_data.get("durationSec")
-            return_value["startDateTime"] = playing_content_data.get("startDateTime")
-        return return_value
+        return self._parse_playing_info(resp)
 
     def get_power_status(self):
-        """Get power status being off, active or standby."""
+        """Get power status being off, active, standby or unauthorized.
+
+        unauthorized means the TV answered but refused the PSK.
+        """
         return_value = "off"  # by default the TV is turned off
         try:
             resp = self.bravia_req_json(
                 "sony/system", self._jdata_build("getPowerStatus", None), False
             )
-            if resp is not None and not resp.get("error"):
-                power_data = resp.get("result")[0]
-                return_value = power_data.get("status")
+            return_value = self._parse_power_status(resp)
         except:  # pylint: disable=broad-except  # noqa: E722
             pass
         return return_value
 
     def _refresh_commands(self):
+        self._load_cache_key()
+        commands = self._cache_get("commands")
+        if commands is not None:
+            self._set_commands(commands)
+            return
         resp = self.bravia_req_json(
             "sony/system", self._jdata_build("getRemoteControllerInfo", None)
         )
-        if not resp.get("error"):
-            self._commands = resp.get("result")[1]
-        else:
-            error = resp.get("error")
-            if "not power-on" not in error:
-                _LOGGER.error("JSON request error: " + json.dumps(resp, indent=4))
+        self._parse_commands(resp)
+        if self._commands:
+            self._cache_set("commands", self._commands)
 
     def get_command_code(self, command_name):
         """Get command code."""
-        if len(self._commands) == 0:
+        if self._commands_refresh_due():
             self._refresh_commands()
-        for command_data in self._commands:
-            if command_data.get("name") == command_name:
-                return command_data.get("value")
-        return None
+        return self._lookup_command_code(command_name)
 
     def get_volume_info(self):
         """Get volume info."""
@@ -363,72 +1486,102 @@ class BraviaRC(object):
             self._jdata_build("getVolumeInformation", None),
             log_errors=False,
         )
-        error = resp.get("error")
-        if not error:
-            results = resp.get("result")[0]
-            for result in results:
-                if result.get("target") == "speaker":
-                    return result
-        elif 40005 not in error:  # 40005 = "Display is Turned off"
-            _LOGGER.error("JSON request error:" + json.dumps(resp, indent=4))
-        return None
+        return self._parse_volume_info(resp)
 
     def get_system_info(self):
         """Get info on TV."""
-        return_value = {}
         resp = self.bravia_req_json(
             "sony/system", self._jdata_build("getSystemInformation", None)
         )
-        if resp is not None and not resp.get("error"):
-            # print('=>', resp, '<=')
-            system_content_data = resp.get("result")[0]
-            return_value["name"] = system_content_data.get("name")
-            return_value["model"] = system_content_data.get("model")
-            return_value["mac"] = system_content_data.get("mac")
-            return_value["serial"] = system_content_data.get("serial")
-            return_value["language"] = system_content_data.get("language")
-        return return_value
+        return self._parse_system_info(resp)
 
     def get_network_info(self):
         """Get info on network."""
-        return_value = {}
         resp = self.bravia_req_json(
             "sony/system", self._jdata_build("getNetworkSettings", None)
         )
-        if resp is not None and not resp.get("error"):
-            # print('=>', resp, '<=')
-            network_content_data = resp.get("result")[0]
-            return_value["mac"] = network_content_data[0]["hwAddr"]
-            return_value["ip"] = network_content_data[0]["ipAddrV4"]
-            return_value["gateway"] = network_content_data[0]["gateway"]
-        return return_value
+        return self._parse_network_info(resp)
 
     def get_current_external_input_status(self):
         """Get current external input status."""
-        return_value = []
         resp = self.bravia_req_json(
             "sony/avContent",
             self._jdata_build("getCurrentExternalInputsStatus", None),
             log_errors=False,
         )
-        if resp is not None and not resp.get("error"):
-            return_value = resp.get("result")[0]
-        return return_value
+        return self._parse_external_input_status(resp)
+
+    def get_state(self):
+        """Get power, volume, playing info and external inputs in one snapshot.
+
+        Only the power status is requested from a TV that is not active, the
+        other fields are then reported as stale. Otherwise they are requested
+        in parallel.
+        """
+        power = self.get_power_status()
+        if power != "active":
+            return self._build_state(power)
+        executor = self._get_executor()
+        volume = executor.submit(self.get_volume_info)
+        playing = executor.submit(self.get_playing_info)
+        external_inputs = executor.submit(self.get_current_external_input_status)
+        return self._build_state(
+            power,
+            {
+                "volume": volume.result(),
+                "playing": playing.result(),
+                "external_inputs": external_inputs.result(),
+            },
+        )
 
     def set_volume_level(self, volume):
         """Set volume level, range 0..1."""
-        # API expects string int value within 0..100 range.
-        api_volume = str(int(round(volume * 100)))
         self.bravia_req_json(
             "sony/audio",
-            self._jdata_build(
-                "setAudioVolume", {"target": "speaker", "volume": api_volume}
-            ),
+            self._jdata_build("setAudioVolume", self._volume_params(volume)),
         )
 
-    def turn_on(self):
-        """Turn the media player on."""
-        self._wakeonlan()
+    def turn_on(
+        self, wait=False, timeout=WAKE_TIMEOUT, interval=WAKE_POLL_INTERVAL, wake=True
+    ):
+        """Turn the media player on.
+
+        With wait the power status is checked every interval seconds until the
+        TV is active, the seconds this took are returned, None after timeout.
+        wake=False skips sending the packets, e.g. when `BraviaFleet.turn_on`
+        sent them for many TVs at once.
+        """
+        started = time.monotonic()
+        if wake:
+            self._wakeonlan()
+        # Do not report the TV as off for up to BACKOFF_MAX after waking it.
+        self._breaker.retry_now()
+        self._notify_command("WakeOnLan")
+        if wait:
+            return self.wait_until_on(timeout, interval, started)
+        return None
+
+    def wait_until_on(
+        self, timeout=WAKE_TIMEOUT, interval=WAKE_POLL_INTERVAL, started=None
+    ):
+        """Wait until the TV reports active, return the seconds since started.
+
+        Returns None when the TV is not active after timeout seconds.
+        """
+        if started is None:
+            started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            # A TV that is off does not answer, only ask once it accepts TCP.
+            if probe(self._host, min(self._timeout[0], interval)):
+                self._breaker.record_success()
+                self._read_cache.invalidate(("getPowerStatus",))
+                if self.get_power_status() == "active":
+                    return time.monotonic() - started
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(interval, remaining))
 
     def turn_on_command(self):
         """Turn the media player on using command.
@@ -436,7 +1589,7 @@ class BraviaRC(object):
         Only confirmed working on Android, can be used when WOL is not available.
         """
         if self.get_power_status() != "active":
-            self.send_req_ircc(self.get_command_code("TvPower"))
+            self.send_command("TvPower")
             self.bravia_req_json(
                 "sony/system",
                 self._jdata_build("setPowerStatus", {"status": True}),
@@ -445,7 +1598,7 @@ class BraviaRC(object):
 
     def turn_off(self):
         """Turn off media player."""
-        self.send_req_ircc(self.get_command_code("PowerOff"))
+        self.send_command("PowerOff")
 
     def turn_off_command(self):
         """Turn off media player using the rest-api for Android TV."""
@@ -455,23 +1608,24 @@ class BraviaRC(object):
 
     def volume_up(self):
         """Volume up the media player."""
-        self.send_req_ircc(self.get_command_code("VolumeUp"))
+        self.send_command("VolumeUp")
 
     def volume_down(self):
         """Volume down media player."""
-        self.send_req_ircc(self.get_command_code("VolumeDown"))
+        self.send_command("VolumeDown")
 
     def mute_volume(self):
         """Send mute command."""
-        self.send_req_ircc(self.get_command_code("Mute"))
+        self.send_command("Mute")
 
     def select_source(self, source):
-        """Set the input source."""
-        if len(self._content_mapping) == 0:
-            self._content_mapping = self.load_source_list()
-        if source in self._content_mapping:
-            uri = self._content_mapping[source]
-            self.play_content(uri)
+        """Set the input source.
+
+        source is a title, display number or URI, see `ChannelDirectory.find`.
+        """
+        channel = self.get_channel_directory().find(source)
+        if channel is not None:
+            self.play_content(channel.uri)
 
     def play_content(self, uri):
         """Play content by URI."""
@@ -481,41 +1635,20 @@ class BraviaRC(object):
 
     def media_play(self):
         """Send play command."""
-        self.send_req_ircc(self.get_command_code("Play"))
+        self.send_command("Play")
 
     def media_pause(self):
         """Send media pause command to media player."""
-        self.send_req_ircc(self.get_command_code("Pause"))
+        self.send_command("Pause")
 
     def media_tvpause(self):
         """Send tv pause command to media player."""
-        self.send_req_ircc(self.get_command_code("TvPause"))
+        self.send_command("TvPause")
 
     def media_next_track(self):
         """Send next track command."""
-        self.send_req_ircc(self.get_command_code("Next"))
+        self.send_command("Next")
 
     def media_previous_track(self):
         """Send the previous track command."""
-        self.send_req_ircc(self.get_command_code("Prev"))
-
-    def add_seconds(self, tm, secs):
-        """Add seconds to time (HH:MM:SS)."""
-        fulldate = datetime.datetime(100, 1, 1, tm.hour, tm.minute, tm.second)
-        fulldate = fulldate + datetime.timedelta(seconds=secs)
-        return fulldate.time()
-
-    def playing_time(self, startdatetime, durationsec):
-        """Return starttime and endtime (HH:MM) of TV program."""
-        # startdatetime format 2017-03-24T00:00:00+0100
-        return_value = {}
-        startdatetime = startdatetime[:19]  # Remove timezone
-
-        starttime = datetime.datetime.strptime(
-            startdatetime, "%Y-%m-%dT%H:%M:%S"
-        ).time()
-        endtime = self.add_seconds(starttime, durationsec)
-
-        return_value["start_time"] = starttime.strftime("%H:%M")
-        return_value["end_time"] = endtime.strftime("%H:%M")
-        return return_value
+        self.send_command("Prev")
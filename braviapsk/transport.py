@@ -0,0 +1,329 @@
+"""HTTP transports of the Sony Bravia client.
+
+`BraviaRC` only sends plain-HTTP POSTs to a TV on the LAN. `HTTPTransport`
+does so over persistent `http.client` connections without any dependency.
+`RequestsTransport` uses a requests session, requests is only imported when
+it is chosen. Both return a `Response` and raise the exceptions below, so the
+client does not depend on either of them.
+"""
+import http.client
+import logging
+import queue
+import socket
+import threading
+from http.cookies import SimpleCookie
+
+from .health import split_host
+
+DEFAULT_TRANSPORT = "http"
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    """Raised when the TV answers with an HTTP error status."""
+
+
+class TransportError(OSError):
+    """Raised when a request cannot be sent or its response cannot be read."""
+
+
+class StaleConnection(TransportError):
+    """Raised when a reused keep-alive connection was dropped by the TV.
+
+    The transports send the request once more on a new connection then.
+    """
+
+
+class Timeout(TransportError):
+    """Raised when the TV does not answer in time."""
+
+
+class ConnectTimeout(Timeout):
+    """Raised when no connection to the TV can be opened in time."""
+
+
+class Response(object):
+    """HTTP response of the TV."""
+
+    def __init__(self, status, headers, content, set_cookies=()):
+        """Initialize the response, headers has lower case names."""
+        self.status = status
+        self.headers = headers
+        self.content = content
+        self._set_cookies = set_cookies
+        self.reused = None  # True if sent over a connection opened before
+
+    def raise_for_status(self):
+        """Raise HTTPError for 4xx and 5xx responses."""
+        if self.status >= 400:
+            raise HTTPError("%s Error" % self.status)
+
+    def json(self):
+        """Decode the body as JSON."""
+        # Imported here, sony_bravia_psk imports this module.
+        from .sony_bravia_psk import json_loads
+
+        return json_loads(self.content)
+
+    @property
+    def cookies(self):
+        """Return the cookies set by the response."""
+        cookies = SimpleCookie()
+        for value in self._set_cookies:
+            cookies.load(value)
+        return {key: morsel.value for key, morsel in cookies.items()}
+
+
+def _split_headers(items):
+    """Return the headers with lower case names and the Set-Cookie values."""
+    headers = {}
+    set_cookies = []
+    for name, value in items:
+        name = name.lower()
+        if name == "set-cookie":
+            set_cookies.append(value)
+        else:
+            headers[name] = value
+    return headers, set_cookies
+
+
+class HTTPTransport(object):
+    """Persistent `http.client` connections to one TV."""
+
+    def __init__(self, host, pool_size, connect_timeout, read_timeout):
+        """Initialize the transport, connections are opened on first use.
+
+        Parameters
+        ---------
+        host: str
+            Address of the TV, optionally with :port.
+        pool_size: int
+            Number of idle keep-alive connections kept open.
+        connect_timeout: float
+            Seconds to wait for a connection.
+        read_timeout: float
+            Seconds to wait for a response.
+        """
+        self._address, self._port = split_host(host)
+        self._pool_size = pool_size
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._idle = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        connection = http.client.HTTPConnection(
+            self._address, self._port, timeout=self._connect_timeout
+        )
+        try:
+            connection.connect()
+        except socket.timeout as exception_instance:
+            connection.close()
+            raise ConnectTimeout(
+                "Connecting to %s:%d timed out" % (self._address, self._port)
+            ) from exception_instance
+        except OSError as exception_instance:
+            connection.close()
+            raise TransportError(
+                "Connecting to %s:%d failed: %s"
+                % (self._address, self._port, exception_instance)
+            ) from exception_instance
+        connection.sock.settimeout(self._read_timeout)
+        return connection
+
+    def _release(self, connection):
+        """Keep a connection for the next request, close it if the pool is full."""
+        with self._lock:
+            if not self._closed and len(self._idle) < self._pool_size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def post(self, path, data, headers):
+        """Post data to /path and return the `Response`.
+
+        The TV closes idle sockets after a while. When the request fails on a
+        reused connection it is sent once more on a new one. The TV may have
+        handled the first one before resetting the connection, so a request
+        that is not idempotent, like a key press, can then be handled twice.
+        """
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is not None:
+            try:
+                return self._exchange(connection, True, path, data, headers)
+            except StaleConnection as exception_instance:
+                _LOGGER.debug(
+                    "Connection dropped, reconnecting: %s", exception_instance
+                )
+        return self._exchange(self._connect(), False, path, data, headers)
+
+    def _exchange(self, connection, reused, path, data, headers):
+        """Send the request over connection and read the `Response`."""
+        try:
+            connection.request("POST", "/" + path, data, headers)
+            response = connection.getresponse()
+            content = response.read()
+        except socket.timeout as exception_instance:
+            connection.close()
+            raise Timeout(
+                "Reading from %s:%d timed out" % (self._address, self._port)
+            ) from exception_instance
+        except (OSError, http.client.HTTPException) as exception_instance:
+            connection.close()
+            if reused:
+                # The TV drops idle sockets, the other idle ones are likely gone too.
+                self._close_idle()
+            raise (StaleConnection if reused else TransportError)(
+                "Request to %s:%d failed: %r"
+                % (self._address, self._port, exception_instance)
+            ) from exception_instance
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+        headers, set_cookies = _split_headers(response.getheaders())
+        result = Response(response.status, headers, content, set_cookies)
+        result.reused = reused
+        return result
+
+    def _close_idle(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def close(self):
+        """Close all idle connections, connections in use are closed when done."""
+        with self._lock:
+            self._closed = True
+        self._close_idle()
+
+
+class RequestsTransport(object):
+    """A requests session with a keep-alive pool for one TV."""
+
+    def __init__(self, host, pool_size, connect_timeout, read_timeout):
+        """Initialize the session, see `HTTPTransport` for the parameters."""
+        # Imported here, requests and its dependencies are slow to import.
+        import requests  # pylint: disable=import-outside-toplevel
+        from requests.adapters import HTTPAdapter
+
+        self._exceptions = requests.exceptions
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, pool_block=False
+        )
+        self._session.mount("http://", adapter)
+        # Only used to tell reused connections apart.
+        self._local = threading.local()
+        self._pools = adapter.poolmanager
+        self._pools.pool_classes_by_scheme = dict(
+            self._pools.pool_classes_by_scheme,
+            http=_counting_pool(
+                self._pools.pool_classes_by_scheme["http"], self._local
+            ),
+        )
+        self._url = "http://" + host + "/"
+        self._timeout = (connect_timeout, read_timeout)
+
+    def post(self, path, data, headers):
+        """Post data to /path and return the `Response`.
+
+        Like `HTTPTransport.post` a request failing on a reused connection is
+        sent once more.
+        """
+        try:
+            return self._post(path, data, headers)
+        except StaleConnection as exception_instance:
+            _LOGGER.debug("Connection dropped, reconnecting: %s", exception_instance)
+        self._close_idle()
+        return self._post(path, data, headers)
+
+    def _close_idle(self):
+        """Close the idle connections of the pools, keeping their size."""
+        for key in self._pools.pools.keys():
+            pool = self._pools.pools.get(key)
+            idle = []
+            while pool is not None and pool.pool is not None:
+                try:
+                    idle.append(pool.pool.get(block=False))
+                except queue.Empty:
+                    break
+            for connection in idle:
+                if connection is not None:
+                    connection.close()
+                pool.pool.put(None)
+
+    def _post(self, path, data, headers):
+        exceptions = self._exceptions
+        self._local.reused = False
+        try:
+            response = self._session.post(
+                self._url + path, data=data, headers=headers, timeout=self._timeout
+            )
+        except exceptions.ConnectTimeout as exception_instance:
+            raise ConnectTimeout(str(exception_instance)) from exception_instance
+        except exceptions.Timeout as exception_instance:
+            raise Timeout(str(exception_instance)) from exception_instance
+        except exceptions.ConnectionError as exception_instance:
+            if self._local.reused:
+                raise StaleConnection(str(exception_instance)) from exception_instance
+            raise TransportError(str(exception_instance)) from exception_instance
+        headers, set_cookies = _split_headers(response.raw.headers.items())
+        result = Response(response.status_code, headers, response.content, set_cookies)
+        result.reused = self._local.reused
+        return result
+
+    def close(self):
+        """Close the session and its connections."""
+        self._session.close()
+
+
+def _counting_pool(pool_class, local):
+    """Return a subclass of a urllib3 pool class using `_counting_connection`."""
+
+    class CountingPool(pool_class):
+        ConnectionCls = _counting_connection(pool_class.ConnectionCls, local)
+
+    return CountingPool
+
+
+def _counting_connection(connection_class, local):
+    """Return a subclass of a urllib3 connection class telling reused ones apart.
+
+    Every request sets local.reused, the session sends it from the calling
+    thread, so concurrent requests do not mix up their connections.
+    """
+
+    class CountingConnection(connection_class):
+        requests_sent = 0
+
+        def request(self, *args, **kwargs):
+            local.reused = self.requests_sent > 0
+            self.requests_sent += 1
+            return super().request(*args, **kwargs)
+
+    return CountingConnection
+
+
+TRANSPORTS = {"http": HTTPTransport, "requests": RequestsTransport}
+
+
+def transport_factory(transport):
+    """Return the class of a transport name of TRANSPORTS.
+
+    Any other callable taking (host, pool_size, connect_timeout, read_timeout)
+    and returning an object with post and close is returned unchanged.
+    """
+    if callable(transport):
+        return transport
+    try:
+        return TRANSPORTS[transport]
+    except KeyError:
+        raise ValueError(
+            "Unknown transport %r, use one of %s"
+            % (transport, ", ".join(sorted(TRANSPORTS)))
+        ) from None
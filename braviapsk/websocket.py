@@ -0,0 +1,185 @@
+"""Minimal websocket (RFC 6455) connection for the notifications of a TV.
+
+Only what the Bravia notification channel needs is supported: text messages,
+ping, pong and close, without extensions. The same `WebSocket` class serves
+the client and, in `braviapsk.mock_server`, the server side.
+"""
+import base64
+import hashlib
+import os
+import socket
+import struct
+import threading
+
+from .health import split_host
+
+GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketError(Exception):
+    """Raised when the handshake fails or the connection is closed."""
+
+
+def accept_key(key):
+    """Return the Sec-WebSocket-Accept value answering a Sec-WebSocket-Key."""
+    digest = hashlib.sha1(key.encode("ascii") + GUID).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def _apply_mask(payload, key):
+    length = len(payload)
+    if not length:
+        return b""
+    mask = (key * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(mask, "big")).to_bytes(
+        length, "big"
+    )
+
+
+def encode_frame(opcode, payload, mask):
+    """Return a single frame, masked when sent by a client."""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+    if not mask:
+        return bytes(header) + payload
+    key = os.urandom(4)
+    return bytes(header) + key + _apply_mask(payload, key)
+
+
+def _read_exactly(rfile, size):
+    data = rfile.read(size)
+    if len(data) < size:
+        raise WebSocketError("Connection closed")
+    return data
+
+
+def read_frame(rfile):
+    """Return (fin, opcode, payload) of the next frame read from a binary file."""
+    head = _read_exactly(rfile, 2)
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", _read_exactly(rfile, 2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", _read_exactly(rfile, 8))[0]
+    key = _read_exactly(rfile, 4) if head[1] & 0x80 else None
+    payload = _read_exactly(rfile, length)
+    if key is not None:
+        payload = _apply_mask(payload, key)
+    return bool(head[0] & 0x80), head[0] & 0x0F, payload
+
+
+class WebSocket(object):
+    """An open websocket, sending from any thread and receiving from one."""
+
+    def __init__(self, sock, rfile, client):
+        """Wrap a connected socket after the handshake."""
+        self._sock = sock
+        self._rfile = rfile
+        self._mask = client
+        self._write_lock = threading.Lock()
+        self.closed = False
+
+    @classmethod
+    def connect(cls, host, path, headers=None, timeout=None):
+        """Open a websocket to ws://host/path.
+
+        Raises WebSocketError when the server does not upgrade the connection,
+        e.g. a TV without notification support. timeout also applies to
+        receive until it is changed with `settimeout`.
+        """
+        sock = socket.create_connection(split_host(host), timeout)
+        try:
+            key = base64.b64encode(os.urandom(16)).decode("ascii")
+            lines = [
+                "GET %s HTTP/1.1" % path,
+                "Host: %s" % host,
+                "Upgrade: websocket",
+                "Connection: Upgrade",
+                "Sec-WebSocket-Key: %s" % key,
+                "Sec-WebSocket-Version: 13",
+            ]
+            lines.extend("%s: %s" % item for item in (headers or {}).items())
+            sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+            rfile = sock.makefile("rb")
+            status = rfile.readline().split(b" ", 2)
+            response_headers = {}
+            while True:
+                line = rfile.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                response_headers[name.strip().lower()] = value.strip()
+            if len(status) < 2 or status[1] != b"101":
+                raise WebSocketError(
+                    "%s%s refused the websocket: %s"
+                    % (host, path, b" ".join(status[1:]).decode("latin-1").strip())
+                )
+            if response_headers.get("sec-websocket-accept") != accept_key(key):
+                raise WebSocketError("Invalid websocket handshake of %s" % host)
+        except BaseException:
+            sock.close()
+            raise
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return cls(sock, rfile, client=True)
+
+    def settimeout(self, timeout):
+        """Set the seconds receive waits for data, None to wait forever."""
+        self._sock.settimeout(timeout)
+
+    def send_text(self, text):
+        """Send a text message."""
+        self._send(OP_TEXT, text if isinstance(text, bytes) else text.encode("utf-8"))
+
+    def _send(self, opcode, payload):
+        with self._write_lock:
+            self._sock.sendall(encode_frame(opcode, payload, self._mask))
+
+    def receive(self):
+        """Return the next message as bytes, answering pings meanwhile.
+
+        Raises WebSocketError when the connection is closed.
+        """
+        message = []
+        while True:
+            fin, opcode, payload = read_frame(self._rfile)
+            if opcode == OP_PING:
+                self._send(OP_PONG, payload)
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                self.close()
+                raise WebSocketError("Connection closed by peer")
+            message.append(payload)
+            if fin:
+                return b"".join(message)
+
+    def close(self):
+        """Close the connection, a blocked receive then raises."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._send(OP_CLOSE, b"")
+        except OSError:
+            pass
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
@@ -0,0 +1,163 @@
+"""Wake-on-LAN of Sony Bravia TVs.
+
+A single magic packet to the limited broadcast address is easily lost on a
+busy network, or never leaves the local subnet. `WakeOnLan` sends bursts of
+prebuilt packets to any number of broadcast addresses and ports from one
+shared UDP socket, for one TV or a whole batch at once.
+"""
+import ipaddress
+import logging
+import socket
+import threading
+import time
+
+WOL_ADDRESSES = ("<broadcast>",)  # limited broadcast of the local network
+WOL_PORTS = (9,)
+WOL_REPEAT = 3  # number of bursts sent per wake
+WOL_INTERVAL = 0.05  # seconds between two bursts
+
+_LOGGER = logging.getLogger(__name__)
+
+_PACKETS = {}  # MAC address: magic packet
+_DEFAULT = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def magic_packet(mac):
+    """Return the magic packet waking the given MAC address.
+
+    The MAC may be written with colons, dashes, dots or without separators.
+    Packets are built once per MAC.
+    """
+    packet = _PACKETS.get(mac)
+    if packet is None:
+        digits = "".join(char for char in mac if char not in ":-. ")
+        if len(digits) != 12:
+            raise ValueError("Invalid MAC address %r" % mac)
+        packet = _PACKETS[mac] = b"\xff" * 6 + bytes.fromhex(digits) * 16
+    return packet
+
+
+def broadcast_address(address):
+    """Return the directed broadcast of a network like 192.168.1.0/24.
+
+    Plain addresses are returned unchanged.
+    """
+    if "/" not in address:
+        return address
+    return str(ipaddress.ip_network(address, strict=False).broadcast_address)
+
+
+def default_waker():
+    """Return the `WakeOnLan` shared by all TVs without their own."""
+    global _DEFAULT  # pylint: disable=global-statement
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            _DEFAULT = WakeOnLan()
+        return _DEFAULT
+
+
+class WakeOnLan(object):
+    """Send magic packets in bursts from one UDP socket."""
+
+    def __init__(
+        self,
+        addresses=WOL_ADDRESSES,
+        ports=WOL_PORTS,
+        repeat=WOL_REPEAT,
+        interval=WOL_INTERVAL,
+    ):
+        """Initialize the sender, the socket is opened on first use.
+
+        Parameters
+        ---------
+        addresses: iterable
+            Broadcast addresses, or networks like 192.168.10.0/24 of which the
+            directed broadcast is used, e.g. for TVs on another VLAN.
+        ports: iterable
+            UDP ports, usually 9 and/or 7.
+        repeat: int
+            Number of bursts, every burst sends each packet to each address
+            and port once.
+        interval: float
+            Seconds between two bursts.
+        """
+        self._targets = [
+            (broadcast_address(address), port)
+            for address in addresses
+            for port in ports
+        ]
+        self.repeat = repeat
+        self.interval = interval
+        self._socket = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        """Enter the runtime context."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the socket when leaving the runtime context."""
+        self.close()
+
+    def _get_socket(self):
+        if self._socket is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            self._socket = sock
+        return self._socket
+
+    def close(self):
+        """Close the socket."""
+        with self._lock:
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+
+    def send_burst(self, macs):
+        """Send the packet of every MAC once to every target, return the count."""
+        packets = [magic_packet(mac) for mac in macs]
+        sent = 0
+        with self._lock:
+            sock = self._get_socket()
+            for packet in packets:
+                for target in self._targets:
+                    try:
+                        sock.sendto(packet, target)
+                    except OSError as exception_instance:
+                        _LOGGER.debug(
+                            "Wake-on-LAN to %s:%d failed: %s",
+                            target[0],
+                            target[1],
+                            exception_instance,
+                        )
+                    else:
+                        sent += 1
+        return sent
+
+    def wake_many(self, macs):
+        """Send all bursts for the given MACs, return the number of packets sent."""
+        macs = list(macs)
+        sent = 0
+        for burst in range(self.repeat):
+            if burst:
+                time.sleep(self.interval)
+            sent += self.send_burst(macs)
+        return sent
+
+    def wake(self, mac):
+        """Send all bursts for one MAC, return the number of packets sent."""
+        return self.wake_many([mac])
+
+    async def async_wake_many(self, macs):
+        """Send all bursts like `wake_many` without blocking the event loop."""
+        # Imported here, asyncio is slow to import and only needed here.
+        import asyncio
+
+        macs = list(macs)
+        sent = 0
+        for burst in range(self.repeat):
+            if burst:
+                await asyncio.sleep(self.interval)
+            sent += self.send_burst(macs)
+        return sent
@@ -20,7 +20,8 @@ setup(
     maintainer="Gerard",
     license="MIT",
     packages=find_packages(),
-    install_requires=["requests"],
+    install_requires=[],
+    extras_require={"speedups": ["orjson"], "requests": ["requests"]},
     keywords="Sony Bravia TV PSK for Home Assistant",
     include_package_data=True,
     zip_safe=False,